@@ -1,22 +1,83 @@
 import os
+import atexit
+import gzip
 import logging
-from flask import Flask
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+try:
+    import orjson  # Optional fast JSON encoder for API responses
+except ImportError:
+    orjson = None
+
 # Configure logging for debugging
 logging.basicConfig(level=logging.DEBUG)
 
+# Request threads only enqueue log records; a background listener does the stream writes
+log_queue = queue.SimpleQueue()
+root_logger = logging.getLogger()
+log_listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+root_logger.handlers = [QueueHandler(log_queue)]
+log_listener.start()
+atexit.register(log_listener.stop)
+
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson while keeping Flask's handling of dates, UUIDs and the like"""
+    
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+    
+    def dumps(self, obj, **kwargs):
+        # Keep Flask's sorted-key output (sort_keys defaults to True) so response bodies and
+        # anything hashed from them stay byte-for-byte stable
+        option = (self.options | orjson.OPT_SORT_KEYS) if self.sort_keys else self.options
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
+
+# JSON bodies (NDVI zone data, history, recommendations) compress well; PNGs already are compressed
+COMPRESS_MIN_SIZE = 512
+COMPRESS_LEVEL = 6
+
+@app.after_request
+def compress_json_response(response):
+    """Gzip JSON responses for clients that accept it"""
+    if response.mimetype != 'application/json' or response.direct_passthrough:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+    
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    
+    # The encoded bytes differ from the identity body, so a strong validator becomes weak
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(etag, weak=True)
+    return response
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///fieldvision.db")
@@ -28,10 +89,87 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize the app with the extension
 db.init_app(app)
 
+# A route issuing more SQL statements than this is logged, so N+1 regressions surface in dev logs
+QUERY_COUNT_WARNING_THRESHOLD = 10
+
+def count_request_query(conn, cursor, statement, parameters, context, executemany):
+    """Count SQL statements issued while handling the current request"""
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+@app.after_request
+def warn_on_query_count(response):
+    """Warn when a request issued more queries than QUERY_COUNT_WARNING_THRESHOLD"""
+    query_count = g.get('query_count', 0)
+    if query_count > QUERY_COUNT_WARNING_THRESHOLD:
+        logging.warning(f"{request.method} {request.path} issued {query_count} SQL queries")
+    return response
+
+def add_missing_columns():
+    """
+    Bring existing tables up to the models: add columns and indexes create_all() skips
+    
+    create_all() only creates missing tables, so columns added to a model later (e.g.
+    Field.area_acres) would be absent from databases created before them. Safe to run on
+    every startup; anything already present is left alone.
+    """
+    inspector = inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        # One transaction per statement: another worker may add the same column or index
+        # concurrently, and that failure should not roll back or stop the rest
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'))
+                logging.info(f"Added missing column {table.name}.{column.name}")
+            except Exception as e:
+                logging.warning(f"Could not add column {table.name}.{column.name}: {e}")
+        for index in table.indexes:
+            try:
+                with db.engine.begin() as conn:
+                    index.create(conn, checkfirst=True)
+            except Exception as e:
+                logging.warning(f"Could not create index {index.name}: {e}")
+
+def prepare_database():
+    """
+    Create tables, add missing columns and run the one-off data migrations
+    
+    Each step is idempotent and runs at startup; a failing step is logged and the rest still
+    run so the app can serve requests. Also available as `flask prepare-db` to run it by hand.
+    """
+    import models
+    steps = [
+        ('create tables', db.create_all),
+        ('add missing columns', add_missing_columns),
+        ('backfill field areas', models.backfill_area_acres),
+        ('migrate legacy monitoring settings', models.migrate_legacy_monitoring_settings),
+    ]
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Database startup step '{name}' failed: {e}")
+
+@app.cli.command('prepare-db')
+def prepare_db_command():
+    """Run the schema updates and data migrations outside of app startup"""
+    prepare_database()
+
 with app.app_context():
     # Import models to ensure tables are created
     import models
-    db.create_all()
+    prepare_database()
+    event.listen(db.engine, 'before_cursor_execute', count_request_query)
 
 # Add custom Jinja2 filter for JSON serialization
 import json
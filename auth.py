@@ -6,10 +6,17 @@ Handles OAuth2 token management and authentication
 import os
 import requests
 import logging
+import threading
+import time
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Refresh this many seconds before the token expires, off the request path
+TOKEN_REFRESH_LEAD_SECONDS = 60
+# A cached token this close to expiry is no longer handed out
+TOKEN_EXPIRY_MARGIN_SECONDS = 15
+
 class SentinelHubAuth:
     """Handles authentication with Sentinel Hub API using OAuth2"""
     
@@ -26,6 +33,9 @@ class SentinelHubAuth:
         self.token_url = "https://services.sentinel-hub.com/oauth/token"
         self.access_token = None
         self.token_expires_in = 0
+        self._token_expires_at = 0.0  # time.monotonic() deadline
+        self._token_used = False
+        self._token_lock = threading.Lock()
         
         if not self.client_id or not self.client_secret:
             logger.warning("Sentinel Hub credentials not found in environment variables")
@@ -41,8 +51,33 @@ class SentinelHubAuth:
             logger.error("Missing Sentinel Hub credentials")
             return None
         
+        if self._token_is_fresh():
+            self._token_used = True
+            return self.access_token
+        
+        with self._token_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not self._token_is_fresh():
+                self._request_token()
+            self._token_used = self.access_token is not None
+            return self.access_token if self._token_is_fresh() else None
+    
+    def _token_is_fresh(self) -> bool:
+        """
+        Check whether the cached token can still be handed out
+        
+        Returns:
+            True if a token is cached and not about to expire
+        """
+        return bool(self.access_token) and time.monotonic() < self._token_expires_at - TOKEN_EXPIRY_MARGIN_SECONDS
+    
+    def _request_token(self):
+        """
+        Request a new token using the client credentials flow and schedule its refresh
+        
+        Must be called with _token_lock held.
+        """
         try:
-            # Request new token using client credentials flow
             response = requests.post(
                 self.token_url,
                 data={
@@ -58,15 +93,34 @@ class SentinelHubAuth:
                 token_data = response.json()
                 self.access_token = token_data.get('access_token')
                 self.token_expires_in = token_data.get('expires_in', 3600)
+                self._token_expires_at = time.monotonic() + self.token_expires_in
+                self._schedule_refresh(self.token_expires_in)
                 logger.info("Successfully obtained Sentinel Hub access token")
-                return self.access_token
             else:
                 logger.error(f"Failed to get access token: {response.status_code} - {response.text}")
-                return None
                 
         except requests.exceptions.RequestException as e:
             logger.error(f"Error requesting access token: {e}")
-            return None
+    
+    def _schedule_refresh(self, expires_in: float):
+        """
+        Start a daemon timer that renews the token shortly before it expires
+        
+        Args:
+            expires_in: Token lifetime in seconds
+        """
+        timer = threading.Timer(max(expires_in - TOKEN_REFRESH_LEAD_SECONDS, 1), self._refresh_in_background)
+        timer.daemon = True
+        timer.start()
+    
+    def _refresh_in_background(self):
+        """Renew the token ahead of expiry so fetches never wait on the OAuth round trip"""
+        with self._token_lock:
+            # Let idle processes lapse; the next request fetches a token synchronously
+            if not self._token_used:
+                return
+            self._token_used = False
+            self._request_token()
     
     def is_authenticated(self) -> bool:
         """
@@ -6,18 +6,25 @@ Monitors vegetation indices for significant changes and sends notifications
 import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-import requests
+from sqlalchemy import insert
 from app import app, db
 from models import Field, FieldAnalysis
 from ndvi_fetcher import NDVIFetcher
 from auth import SentinelHubAuth
-from routes import generate_field_ai_insights
+from routes import generate_field_ai_insights, fetch_current_weather_report
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+# Fields whose imagery is fetched together in one batch during the daily run
+MONITORING_BATCH_FIELDS = 4
+
+# A batch's alert emails are independent SendGrid API calls, so they are sent side by side
+email_executor = ThreadPoolExecutor(max_workers=MONITORING_BATCH_FIELDS)
+
 class FieldMonitor:
     """Automated field monitoring and alert system"""
     
@@ -35,43 +42,60 @@ class FieldMonitor:
         time_since_analysis = datetime.utcnow() - field.last_analyzed
         return time_since_analysis > timedelta(hours=24)
     
-    def analyze_field_changes(self, field: Field) -> Dict:
-        """Analyze field for vegetation changes and generate insights"""
+    def get_field_bounds(self, field: Field):
+        """Get the Sentinel Hub bbox and masking geometry for a field"""
+        return field.get_bounds_and_geometry()
+    
+    def prefetch_field_images(self, fields: List[Field]) -> Dict[int, Dict[str, Optional[bytes]]]:
+        """
+        Fetch every monitored index for several fields as one batch
+        
+        All requests share the fetcher's pooled connections and access token, and run
+        concurrently instead of field after field.
+        """
+        jobs = {}
+        for field in fields:
+            try:
+                bbox, geometry = self.get_field_bounds(field)
+            except Exception as e:
+                logging.error(f"Could not compute bounds for field {field.id}: {e}")
+                continue
+            for index_type in self.vegetation_indices:
+                jobs[(field.id, index_type)] = (bbox, index_type, geometry)
+        
+        images_by_field = {}
+        for (field_id, index_type), image_data in self.ndvi_fetcher.fetch_vegetation_index_batch(jobs).items():
+            images_by_field.setdefault(field_id, {})[index_type] = image_data
+        return images_by_field
+    
+    def analyze_field_changes(self, field: Field, images: Optional[Dict[str, Optional[bytes]]] = None,
+                              store: bool = True) -> Dict:
+        """
+        Analyze field for vegetation changes and generate insights
+        
+        With store=False the new FieldAnalysis is not written; its column values are returned
+        under 'analysis_row' so the caller can insert many fields' rows together.
+        """
         logging.info(f"Analyzing field {field.id} - {field.name} for automated monitoring")
         
         try:
-            # Get field coordinates and bbox
-            coordinates = field.get_polygon_coordinates()
-            lats = [coord[0] for coord in coordinates]
-            lngs = [coord[1] for coord in coordinates]
-            bbox = [min(lngs), min(lats), max(lngs), max(lats)]
-            
-            # Create geometry for masking
-            geometry = {
-                "type": "Polygon",
-                "coordinates": [[
-                    [coord[1], coord[0]] for coord in coordinates
-                ] + [[coordinates[0][1], coordinates[0][0]]]]
-            }
-            
             # Get historical analysis for comparison
             previous_analysis = FieldAnalysis.query.filter_by(field_id=field.id)\
                 .order_by(FieldAnalysis.analysis_date.desc()).first()
             
-            # Generate current vegetation indices
+            # Generate current vegetation indices (fetched concurrently) unless prefetched
             current_results = {}
-            for index_type in self.vegetation_indices:
-                try:
-                    image_data = self.ndvi_fetcher.fetch_vegetation_index_image(
-                        bbox, index_type, geometry=geometry
-                    )
-                    if image_data:
-                        current_results[index_type] = {'success': True, 'size': len(image_data)}
-                        logging.info(f"Successfully generated {index_type.upper()} for field {field.id}")
-                    else:
-                        current_results[index_type] = {'success': False, 'error': 'Image generation failed'}
-                except Exception as e:
-                    current_results[index_type] = {'success': False, 'error': str(e)}
+            if images is None:
+                bbox, geometry = self.get_field_bounds(field)
+                images = self.ndvi_fetcher.fetch_vegetation_index_images(
+                    bbox, self.vegetation_indices, geometry=geometry
+                )
+            for index_type, image_data in images.items():
+                if image_data:
+                    current_results[index_type] = {'success': True, 'size': len(image_data)}
+                    logging.info(f"Successfully generated {index_type.upper()} for field {field.id}")
+                else:
+                    current_results[index_type] = {'success': False, 'error': 'Image generation failed'}
             
             # Calculate change metrics
             change_analysis = self.detect_vegetation_changes(field, current_results, previous_analysis)
@@ -94,32 +118,30 @@ class FieldMonitor:
             }
             
             # Get weather data
-            try:
-                weather_api_key = os.environ.get('OPENWEATHERMAP_API_KEY')
-                if weather_api_key:
-                    weather_url = f"http://api.openweathermap.org/data/2.5/weather?lat={field.center_lat}&lon={field.center_lng}&appid={weather_api_key}&units=imperial"
-                    weather_response = requests.get(weather_url, timeout=10)
-                    if weather_response.status_code == 200:
-                        analysis_context['weather'] = weather_response.json()
-            except Exception as e:
-                logging.warning(f"Failed to fetch weather data: {e}")
+            weather_data = fetch_current_weather_report(field.center_lat, field.center_lng)
+            if weather_data:
+                analysis_context['weather'] = weather_data
             
             ai_insights = generate_field_ai_insights(analysis_context)
             
             # Store new analysis
-            new_analysis = FieldAnalysis()
-            new_analysis.field_id = field.id
-            new_analysis.ai_analysis_data = json.dumps(ai_insights)
-            db.session.add(new_analysis)
-            field.last_analyzed = datetime.utcnow()
-            db.session.commit()
+            analysis_row = {
+                'field_id': field.id,
+                'analysis_date': datetime.utcnow(),
+                'ai_analysis_data': json.dumps(ai_insights)
+            }
+            field.last_analyzed = analysis_row['analysis_date']
+            if store:
+                db.session.add(FieldAnalysis(**analysis_row))
+                db.session.commit()
             
             return {
                 'field': field,
                 'current_results': current_results,
                 'change_analysis': change_analysis,
                 'ai_insights': ai_insights,
-                'urgent_alerts': self.identify_urgent_alerts(change_analysis, ai_insights)
+                'urgent_alerts': self.identify_urgent_alerts(change_analysis, ai_insights),
+                'analysis_row': analysis_row
             }
             
         except Exception as e:
@@ -276,6 +298,23 @@ class FieldMonitor:
             logging.info("=== END ANALYSIS NOTIFICATION ===")
             return False
     
+    def send_email_alerts(self, field_analyses: List[Dict], recipient_email: str) -> int:
+        """
+        Send alert emails for several analyzed fields concurrently
+        
+        Args:
+            field_analyses: Results of analyze_field_changes, one email each
+            recipient_email: Address every alert is sent to
+        
+        Returns:
+            Number of emails SendGrid accepted
+        """
+        if not field_analyses:
+            return 0
+        sent = email_executor.map(lambda field_analysis: self.send_email_alert(field_analysis, recipient_email),
+                                  field_analyses)
+        return sum(1 for was_sent in sent if was_sent)
+    
     def generate_email_content(self, field_analysis: Dict) -> str:
         """Generate HTML email content for field analysis"""
         field = field_analysis['field']
@@ -392,6 +431,19 @@ class FieldMonitor:
         
         return html_content
     
+    def store_analysis_rows(self, analysis_rows: List[Dict], results: Dict):
+        """Insert a batch of FieldAnalysis rows in one statement and commit the fields' last_analyzed"""
+        if not analysis_rows:
+            return
+        try:
+            db.session.execute(insert(FieldAnalysis), analysis_rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error_msg = f"Error storing analyses for {len(analysis_rows)} fields: {str(e)}"
+            logging.error(error_msg)
+            results['errors'].append(error_msg)
+    
     def run_daily_monitoring(self, user_email: str = None) -> Dict:
         """Run daily monitoring for all fields"""
         logging.info("Starting daily field monitoring run")
@@ -408,11 +460,21 @@ class FieldMonitor:
             # Get all fields that need analysis
             fields = Field.query.all()
             results['total_fields'] = len(fields)
+            stale_fields = [field for field in fields if self.should_analyze_field(field)]
             
-            for field in fields:
-                if self.should_analyze_field(field):
+            # Imagery for a group of fields is fetched as one batch, bounded so only
+            # a few fields' images are held in memory at a time
+            for start in range(0, len(stale_fields), MONITORING_BATCH_FIELDS):
+                batch = stale_fields[start:start + MONITORING_BATCH_FIELDS]
+                images_by_field = self.prefetch_field_images(batch)
+                analysis_rows = []
+                email_analyses = []
+                
+                for field in batch:
                     try:
-                        field_analysis = self.analyze_field_changes(field)
+                        field_analysis = self.analyze_field_changes(field, images_by_field.get(field.id), store=False)
+                        if 'analysis_row' in field_analysis:
+                            analysis_rows.append(field_analysis['analysis_row'])
                         results['analyzed_fields'] += 1
                         
                         # Count urgent alerts
@@ -422,13 +484,16 @@ class FieldMonitor:
                         
                         # Send email if configured and alerts exist
                         if user_email and (urgent_alerts or len(urgent_alerts) == 0):  # Send daily reports
-                            if self.send_email_alert(field_analysis, user_email):
-                                results['emails_sent'] += 1
+                            email_analyses.append(field_analysis)
                         
                     except Exception as e:
                         error_msg = f"Error analyzing field {field.id}: {str(e)}"
                         logging.error(error_msg)
                         results['errors'].append(error_msg)
+                
+                # Sent before the batch commits, while the fields' attributes are still loaded
+                results['emails_sent'] += self.send_email_alerts(email_analyses, user_email)
+                self.store_analysis_rows(analysis_rows, results)
             
             logging.info(f"Daily monitoring completed: {results}")
             return results
@@ -1,8 +1,27 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.orm import deferred
 import json
+import hashlib
+import logging
+import numpy as np
+from utils.ndvi_processor import calculate_field_zones
+
+try:
+    import orjson  # Optional faster parser for the JSON text columns
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def load_json_text(value):
+    """Parse a stored JSON column, using orjson when it is installed"""
+    return orjson.loads(value) if orjson is not None else json.loads(value)
 
 class Field(db.Model):
+    # Image blobs are deferred: list pages only need metadata, and the *_cache_date
+    # columns tell whether an image exists without loading it
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     polygon_data = db.Column(db.Text, nullable=False)  # JSON string of coordinates
@@ -10,52 +29,96 @@ class Field(db.Model):
     center_lng = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_analyzed = db.Column(db.DateTime)
-    cached_ndvi_image = db.Column(db.LargeBinary)  # Store NDVI image bytes
+    cached_ndvi_image = deferred(db.Column(db.LargeBinary))  # Store NDVI image bytes
     ndvi_cache_date = db.Column(db.DateTime)  # When NDVI was cached
-    cached_rgb_image = db.Column(db.LargeBinary)  # Store RGB satellite image bytes
+    cached_rgb_image = deferred(db.Column(db.LargeBinary))  # Store RGB satellite image bytes
     rgb_cache_date = db.Column(db.DateTime)  # When RGB image was cached
     
     # Additional vegetation index caches
-    cached_ndre_image = db.Column(db.LargeBinary)  # Store NDRE image bytes
+    cached_ndre_image = deferred(db.Column(db.LargeBinary))  # Store NDRE image bytes
     ndre_cache_date = db.Column(db.DateTime)  # When NDRE was cached
-    cached_moisture_image = db.Column(db.LargeBinary)  # Store Moisture index image bytes
+    cached_moisture_image = deferred(db.Column(db.LargeBinary))  # Store Moisture index image bytes
     moisture_cache_date = db.Column(db.DateTime)  # When Moisture was cached
-    cached_evi_image = db.Column(db.LargeBinary)  # Store EVI image bytes
+    cached_evi_image = deferred(db.Column(db.LargeBinary))  # Store EVI image bytes
     evi_cache_date = db.Column(db.DateTime)  # When EVI was cached
-    cached_ndwi_image = db.Column(db.LargeBinary)  # Store NDWI image bytes
+    cached_ndwi_image = deferred(db.Column(db.LargeBinary))  # Store NDWI image bytes
     ndwi_cache_date = db.Column(db.DateTime)  # When NDWI was cached
-    cached_chlorophyll_image = db.Column(db.LargeBinary)  # Store Chlorophyll image bytes
+    cached_chlorophyll_image = deferred(db.Column(db.LargeBinary))  # Store Chlorophyll image bytes
     chlorophyll_cache_date = db.Column(db.DateTime)  # When Chlorophyll was cached
+    zones_data = db.Column(db.Text)  # JSON of the 3x3 zone grid, derived from polygon_data when it is set
+    area_acres = db.Column(db.Float)  # Polygon area, derived from polygon_data when it is set
     
     # Relationship to analyses
-    analyses = db.relationship('FieldAnalysis', backref='field', lazy=True, cascade='all, delete-orphan')
+    # Oldest first, so templates can take the newest from the end (|last, [-3:])
+    analyses = db.relationship('FieldAnalysis', backref='field', lazy=True, cascade='all, delete-orphan',
+                               order_by='FieldAnalysis.analysis_date')
+    monitoring_settings = db.relationship('MonitoringSettings', uselist=False, lazy=True, cascade='all, delete-orphan')
     
     def get_polygon_coordinates(self):
-        """Return polygon coordinates as a list of [lat, lng] pairs"""
-        return json.loads(self.polygon_data)
+        """
+        Return polygon coordinates as a list of [lat, lng] pairs
+        
+        The parsed list is kept on the instance until polygon_data changes, so repeated calls
+        within a request parse the JSON once. Callers must not modify the returned list.
+        """
+        cached = self.__dict__.get('_parsed_polygon')
+        if cached is None or cached[0] is not self.polygon_data:
+            cached = (self.polygon_data, load_json_text(self.polygon_data))
+            self._parsed_polygon = cached
+        return cached[1]
     
     def set_polygon_coordinates(self, coordinates):
-        """Set polygon coordinates from a list of [lat, lng] pairs"""
+        """Set polygon coordinates from a list of [lat, lng] pairs and store the zone grid they determine"""
         self.polygon_data = json.dumps(coordinates)
+        self.zones_data = json.dumps(calculate_field_zones(coordinates))
+        self.area_acres = self._compute_area_acres(coordinates)
+    
+    def get_bounds_and_geometry(self, coordinates=None):
+        """
+        Get the Sentinel Hub bbox and the GeoJSON masking polygon for this field
+        
+        Args:
+            coordinates: Already-parsed polygon coordinates, to skip parsing polygon_data again
+        
+        Returns:
+            Tuple of ([min_lng, min_lat, max_lng, max_lat], closed GeoJSON Polygon in [lng, lat] order)
+        """
+        coords = np.asarray(coordinates if coordinates is not None else self.get_polygon_coordinates(), dtype=np.float64)
+        min_lat, min_lng = coords.min(axis=0).tolist()
+        max_lat, max_lng = coords.max(axis=0).tolist()
+        ring = coords[:, ::-1]
+        geometry = {
+            "type": "Polygon",
+            "coordinates": [np.vstack([ring, ring[:1]]).tolist()]
+        }
+        return [min_lng, min_lat, max_lng, max_lat], geometry
+    
+    def get_zones(self):
+        """Return the 3x3 zone grid as {zone_id: [[lat, lng], ...]}, computing it once for fields saved before it was stored"""
+        if self.zones_data is None:
+            self.zones_data = json.dumps(calculate_field_zones(self.get_polygon_coordinates()))
+        return load_json_text(self.zones_data)
     
     def calculate_area_acres(self):
-        """Calculate field area in acres using Shoelace formula"""
-        coords = self.get_polygon_coordinates()
+        """Get field area in acres, computing it once for fields saved before it was stored"""
+        if self.area_acres is None:
+            self.area_acres = self._compute_area_acres(self.get_polygon_coordinates())
+        return self.area_acres
+    
+    @staticmethod
+    def _compute_area_acres(coords):
+        """Calculate polygon area in acres using Shoelace formula"""
         if len(coords) < 3:
             return 0.0
         
-        # Convert to radians and calculate area using spherical excess
-        import math
-        total_area = 0.0
-        n = len(coords)
+        # Convert to radians and calculate area using spherical excess, one vectorized pass
+        # over each edge (vertex i to vertex i+1, wrapping around)
+        radians = np.radians(np.asarray(coords, dtype=np.float64)[:, :2])
+        lat1, lng1 = radians[:, 0], radians[:, 1]
+        lat2, lng2 = np.roll(lat1, -1), np.roll(lng1, -1)
         
-        for i in range(n):
-            j = (i + 1) % n
-            lat1, lng1 = math.radians(coords[i][0]), math.radians(coords[i][1])
-            lat2, lng2 = math.radians(coords[j][0]), math.radians(coords[j][1])
-            
-            # Simple approximation for small areas
-            total_area += (lng2 - lng1) * (2 + math.sin(lat1) + math.sin(lat2))
+        # Simple approximation for small areas
+        total_area = float(np.sum((lng2 - lng1) * (2 + np.sin(lat1) + np.sin(lat2))))
         
         # Convert to acres (rough approximation)
         area_sq_meters = abs(total_area) * 6378137 * 6378137 / 2
@@ -75,7 +138,7 @@ class Field(db.Model):
     
     def has_cached_ndvi(self):
         """Check if field has a cached NDVI image"""
-        return self.cached_ndvi_image is not None
+        return self.ndvi_cache_date is not None
     
     def is_ndvi_cache_fresh(self, max_age_days=30):
         """Check if cached NDVI is still fresh (within max_age_days)"""
@@ -95,7 +158,7 @@ class Field(db.Model):
     
     def has_cached_rgb(self):
         """Check if field has a cached RGB satellite image"""
-        return self.cached_rgb_image is not None
+        return self.rgb_cache_date is not None
     
     def is_rgb_cache_fresh(self, max_age_days=30):
         """Check if cached RGB image is still fresh (within max_age_days)"""
@@ -116,8 +179,23 @@ class Field(db.Model):
     
     def has_cached_vegetation_index(self, index_type):
         """Check if field has a cached vegetation index image"""
-        cached_image = getattr(self, f'cached_{index_type}_image', None)
-        return cached_image is not None
+        return getattr(self, f'{index_type}_cache_date', None) is not None
+    
+    def get_cache_etag(self, index_type):
+        """Get an ETag for a cached image ('ndvi', 'rgb' or an index type), derived from its cache date"""
+        return Field.format_cache_etag(self.id, index_type, getattr(self, f'{index_type}_cache_date', None))
+    
+    @staticmethod
+    def format_cache_etag(field_id, index_type, cache_date):
+        """Build the cached-image ETag from column values, for queries that skip loading the Field"""
+        if not cache_date:
+            return None
+        return f"{field_id}-{index_type}-{cache_date.timestamp():.6f}"
+    
+    def get_analysis_etag(self):
+        """Get a version token for analysis inputs: the polygon plus the day's satellite imagery window"""
+        version = f"{self.polygon_data}|{datetime.utcnow().date().isoformat()}"
+        return hashlib.sha1(version.encode('utf-8')).hexdigest()
     
     def is_vegetation_index_cache_fresh(self, index_type, max_age_days=30):
         """Check if cached vegetation index is still fresh (within max_age_days)"""
@@ -127,7 +205,30 @@ class Field(db.Model):
         age = datetime.utcnow() - cache_date
         return age.days <= max_age_days
 
+def backfill_area_acres():
+    """
+    Store area_acres for fields saved before the column existed
+    
+    List pages read the stored acreage without loading polygons; a NULL would make each such
+    row load its polygon on every request. Runs at startup and only touches NULL rows; a row
+    whose polygon cannot be parsed is logged and left NULL.
+    """
+    rows = db.session.execute(select(Field.id, Field.polygon_data).where(Field.area_acres.is_(None))).all()
+    updates = []
+    for row in rows:
+        try:
+            updates.append({'id': row.id, 'area_acres': Field._compute_area_acres(load_json_text(row.polygon_data))})
+        except Exception as e:
+            logger.warning(f"Skipping area backfill for field {row.id}: {e}")
+    if not updates:
+        return
+    db.session.execute(update(Field), updates)
+    db.session.commit()
+
 class FieldAnalysis(db.Model):
+    # Latest-analysis lookups and history pages scan one field's rows by date
+    __table_args__ = (db.Index('ix_field_analysis_field_id_analysis_date', 'field_id', 'analysis_date'),)
+    
     id = db.Column(db.Integer, primary_key=True)
     field_id = db.Column(db.Integer, db.ForeignKey('field.id'), nullable=False)
     analysis_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -136,10 +237,12 @@ class FieldAnalysis(db.Model):
     recommendations = db.Column(db.Text)  # JSON string of AI recommendations
     weather_data = db.Column(db.Text)  # JSON string of weather information
     ai_analysis_data = db.Column(db.Text)  # JSON string of comprehensive AI analysis
+    etag = db.Column(db.String(40))  # Field.get_analysis_etag() of the inputs this analysis used
+    analysis_fingerprint = db.Column(db.String(32))  # Inputs of a comprehensive AI analysis, to reuse its result
     
     def get_ndvi_data(self):
         """Return NDVI data as a dictionary"""
-        return json.loads(self.ndvi_data) if self.ndvi_data else {}
+        return load_json_text(self.ndvi_data) if self.ndvi_data else {}
     
     def set_ndvi_data(self, data):
         """Set NDVI data from a dictionary"""
@@ -147,7 +250,7 @@ class FieldAnalysis(db.Model):
     
     def get_health_scores(self):
         """Return health scores as a dictionary"""
-        return json.loads(self.health_scores) if self.health_scores else {}
+        return load_json_text(self.health_scores) if self.health_scores else {}
     
     def set_health_scores(self, data):
         """Set health scores from a dictionary"""
@@ -155,7 +258,7 @@ class FieldAnalysis(db.Model):
     
     def get_recommendations(self):
         """Return recommendations as a list"""
-        return json.loads(self.recommendations) if self.recommendations else []
+        return load_json_text(self.recommendations) if self.recommendations else []
     
     def set_recommendations(self, data):
         """Set recommendations from a list"""
@@ -163,7 +266,7 @@ class FieldAnalysis(db.Model):
     
     def get_weather_data(self):
         """Return weather data as a dictionary"""
-        return json.loads(self.weather_data) if self.weather_data else {}
+        return load_json_text(self.weather_data) if self.weather_data else {}
     
     def set_weather_data(self, data):
         """Set weather data from a dictionary"""
@@ -171,8 +274,51 @@ class FieldAnalysis(db.Model):
     
     def get_ai_analysis_data(self):
         """Return comprehensive AI analysis data as a dictionary"""
-        return json.loads(self.ai_analysis_data) if self.ai_analysis_data else {}
+        return load_json_text(self.ai_analysis_data) if self.ai_analysis_data else {}
     
     def set_ai_analysis_data(self, data):
         """Set comprehensive AI analysis data from a dictionary"""
         self.ai_analysis_data = json.dumps(data)
+
+class MonitoringSettings(db.Model):
+    # One row per field, looked up by primary key; settings used to be stored as FieldAnalysis rows
+    field_id = db.Column(db.Integer, db.ForeignKey('field.id'), primary_key=True)
+    settings = db.Column(db.Text, nullable=False)  # JSON string of monitoring settings
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_settings(self):
+        """Return monitoring settings as a dictionary"""
+        return load_json_text(self.settings) if self.settings else {}
+    
+    def set_settings(self, data):
+        """Set monitoring settings from a dictionary"""
+        self.settings = json.dumps(data)
+
+def migrate_legacy_monitoring_settings():
+    """
+    Move monitoring settings stored as FieldAnalysis rows into MonitoringSettings
+    
+    Before the table existed, each save added a FieldAnalysis row whose ai_analysis_data was
+    {'type': 'monitoring_settings', ...}. The newest one per field becomes that field's row
+    (unless it already has one) and all of them are deleted, so they stop showing up as
+    analyses. Runs at startup; once migrated there is nothing left to match.
+    """
+    legacy_rows = FieldAnalysis.query.filter(
+        FieldAnalysis.ai_analysis_data.like('%monitoring_settings%')
+    ).order_by(FieldAnalysis.field_id, FieldAnalysis.analysis_date.desc()).all()
+    if not legacy_rows:
+        return
+    
+    migrated_fields = set()
+    for legacy_row in legacy_rows:
+        data = legacy_row.get_ai_analysis_data()
+        if data.get('type') != 'monitoring_settings':
+            continue  # An analysis that merely mentions the phrase
+        if legacy_row.field_id not in migrated_fields:
+            migrated_fields.add(legacy_row.field_id)
+            if db.session.get(MonitoringSettings, legacy_row.field_id) is None:
+                settings_row = MonitoringSettings(field_id=legacy_row.field_id)
+                settings_row.set_settings(data.get('settings', {}))
+                db.session.add(settings_row)
+        db.session.delete(legacy_row)
+    db.session.commit()
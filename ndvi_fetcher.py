@@ -4,115 +4,201 @@ Handles NDVI image requests and processing
 """
 
 import requests
+import urllib3
 import logging
+import json
 import numpy as np
+import hashlib
 import math
+import threading
+import time
+import cv2
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFilter
-from typing import List, Tuple, Optional
+from PIL import Image, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Hashable, List, Tuple, Optional
 from datetime import datetime, timedelta
 from auth import SentinelHubAuth
 
+try:
+    import orjson  # Optional fast JSON encoder for the large evalscript payloads
+except ImportError:
+    orjson = None
+
+try:
+    import pyspng  # Optional SIMD PNG decoder, noticeably faster than Pillow on large tiles
+except ImportError:
+    pyspng = None
+
 logger = logging.getLogger(__name__)
 
-class NDVIFetcher:
-    """Handles NDVI data fetching from Sentinel Hub API"""
-    
-    def __init__(self, auth_handler: SentinelHubAuth):
-        """
-        Initialize NDVI fetcher
-        
-        Args:
-            auth_handler: Configured SentinelHubAuth instance
-        """
-        self.auth = auth_handler
-        self.process_url = "https://services.sentinel-hub.com/api/v1/process"
-    
-    def get_evalscript(self, index_type: str) -> str:
-        """
-        Return the evalscript for calculating different vegetation indices
-        
-        Args:
-            index_type: Type of vegetation index ('ndvi', 'ndre', 'moisture', 'evi', 'ndwi', 'chlorophyll')
-            
-        Returns:
-            Evalscript string for the specified index calculation
-        """
-        if index_type == 'ndvi':
-            return self.get_ndvi_evalscript()
-        elif index_type == 'ndre':
-            return self.get_ndre_evalscript()
-        elif index_type == 'moisture':
-            return self.get_moisture_evalscript()
-        elif index_type == 'evi':
-            return self.get_evi_evalscript()
-        elif index_type == 'ndwi':
-            return self.get_ndwi_evalscript()
-        elif index_type == 'chlorophyll':
-            return self.get_chlorophyll_evalscript()
-        elif index_type == 'true_color':
-            return self.get_true_color_evalscript()
-        else:
-            return self.get_ndvi_evalscript()  # Default to NDVI
-    
-    def get_ndvi_evalscript(self) -> str:
-        """
-        Return the evalscript for calculating NDVI from Sentinel-2 data
-        
-        Returns:
-            Evalscript string for NDVI calculation
-        """
-        return """
+# Imagery for a given request body is stable for the day, so finished images are
+# kept in memory for that long; the entry cap bounds memory (images run to a few MB)
+IMAGE_CACHE_TTL_SECONDS = 24 * 60 * 60
+IMAGE_CACHE_MAX_ENTRIES = 64
+
+# Upper bound on simultaneous Process API requests from one batch
+MAX_CONCURRENT_REQUESTS = 6
+
+# Process API output block: a single PNG response
+_PNG_RESPONSES = [{"identifier": "default", "format": {"type": "image/png"}}]
+
+# Polygons covering at least this share of their bbox are served unmasked
+FULL_COVERAGE_RATIO = 0.99
+
+# Fractional bits used for sub-pixel polygon vertices in cv2.fillPoly
+_FILL_POLY_SHIFT = 4
+_FILL_POLY_SCALE = 1 << _FILL_POLY_SHIFT
+
+# CRS block shared by every Process API request (coordinates are WGS84 lng/lat)
+_WGS84_PROPERTIES = {"crs": "http://www.opengis.net/def/crs/EPSG/0/4326"}
+
+# Index values travel as quantized UINT16 codes and are colored client-side through a
+# lookup table built from the ramp. code = round((value + OFFSET) * SCALE), clamped to
+# [1, 65535]; code 0 marks SCL-masked pixels and 65535 also carries NaN (no data).
+_INDEX_CODE_OFFSET = 10.0
+_INDEX_CODE_SCALE = 1000
+_INDEX_CODE_MASKED = 0
+_INDEX_CODE_MAX = 65535
+
+# Shared shape of every index evalscript: skip SCL cloud/shadow/snow pixels, compute the
+# index and return it as a single quantized band. Braces are doubled for str.format.
+_EVALSCRIPT_TEMPLATE = """
 //VERSION=3
-function setup() {
-    return {
-        input: [{
-            bands: ["B04", "B08", "SCL"],
+function setup() {{
+    return {{
+        input: [{{
+            bands: [{bands}],
             units: "DN"
-        }],
-        output: {
-            bands: 3,
-            sampleType: "AUTO"
-        }
-    };
-}
+        }}],
+        output: {{
+            bands: 1,
+            sampleType: "UINT16"
+        }}
+    }};
+}}
 
-function evaluatePixel(sample) {
-    // B04 = Red, B08 = NIR
-    let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
-    
-    // Mask clouds using Scene Classification Layer (SCL)
-    if (sample.SCL == 3 || sample.SCL == 8 || sample.SCL == 9 || sample.SCL == 10 || sample.SCL == 11) {
-        // Cloud shadows, medium/high probability clouds, thin cirrus, snow
-        return [0.4, 0.4, 0.4]; // Dark gray for masked pixels
-    }
+function evaluatePixel(sample) {{
+    // Mask cloud shadows, medium/high probability clouds, thin cirrus and snow (SCL)
+    if (sample.SCL === 3 || sample.SCL === 8 || sample.SCL === 9 || sample.SCL === 10 || sample.SCL === 11) {{
+        return [{masked}];
+    }}
     
-    // Agricultural stress detection color mapping
-    if (ndvi < -0.3) return [0.2, 0.2, 0.4]; // Deep water - dark blue
-    if (ndvi < -0.1) return [0.4, 0.4, 0.6]; // Shallow water - blue
-    if (ndvi < 0.05) return [0.8, 0.7, 0.6]; // Bare soil/sand - tan
-    if (ndvi < 0.1) return [1.0, 0.2, 0.2]; // Critical stress/dying vegetation - bright red
-    if (ndvi < 0.15) return [1.0, 0.4, 0.2]; // Severe stress - red-orange
-    if (ndvi < 0.2) return [1.0, 0.6, 0.2]; // Moderate stress - orange
-    if (ndvi < 0.25) return [1.0, 0.8, 0.2]; // Mild stress - yellow-orange
-    if (ndvi < 0.3) return [1.0, 1.0, 0.2]; // Early stress - yellow
-    if (ndvi < 0.35) return [0.8, 1.0, 0.2]; // Recovery/low vigor - light green
-    if (ndvi < 0.45) return [0.6, 0.9, 0.1]; // Moderate health - green
-    if (ndvi < 0.55) return [0.4, 0.8, 0.1]; // Good health - darker green
-    if (ndvi < 0.65) return [0.2, 0.7, 0.1]; // Very healthy - dark green
-    if (ndvi < 0.75) return [0.1, 0.6, 0.1]; // Excellent health - very dark green
-    return [0.05, 0.4, 0.05]; // Peak health - deepest green
-}
+    let value = {expression};
+    if (isNaN(value)) {{
+        return [{max_code}];
+    }}
+    return [Math.min({max_code}, Math.max(1, Math.round((value + {offset}) * {scale})))];
+}}
 """
 
-    def get_ndre_evalscript(self) -> str:
-        """NDRE (Normalized Difference Red Edge Index) - Sensitive to chlorophyll and nitrogen"""
-        return """
+# Per-index bands, formula and color ramp; the final ramp entry (threshold None) is the fallthrough color
+_INDEX_SPECS = {
+    # NDVI - agricultural stress detection (B04 = Red, B08 = NIR)
+    'ndvi': {
+        'bands': ["B04", "B08", "SCL"],
+        'expression': "(sample.B08 - sample.B04) / (sample.B08 + sample.B04)",
+        'mask_gray': 0.4,
+        'ramp': [
+            (-0.3, (0.2, 0.2, 0.4), "Deep water - dark blue"),
+            (-0.1, (0.4, 0.4, 0.6), "Shallow water - blue"),
+            (0.05, (0.8, 0.7, 0.6), "Bare soil/sand - tan"),
+            (0.1, (1.0, 0.2, 0.2), "Critical stress/dying vegetation - bright red"),
+            (0.15, (1.0, 0.4, 0.2), "Severe stress - red-orange"),
+            (0.2, (1.0, 0.6, 0.2), "Moderate stress - orange"),
+            (0.25, (1.0, 0.8, 0.2), "Mild stress - yellow-orange"),
+            (0.3, (1.0, 1.0, 0.2), "Early stress - yellow"),
+            (0.35, (0.8, 1.0, 0.2), "Recovery/low vigor - light green"),
+            (0.45, (0.6, 0.9, 0.1), "Moderate health - green"),
+            (0.55, (0.4, 0.8, 0.1), "Good health - darker green"),
+            (0.65, (0.2, 0.7, 0.1), "Very healthy - dark green"),
+            (0.75, (0.1, 0.6, 0.1), "Excellent health - very dark green"),
+            (None, (0.05, 0.4, 0.05), "Peak health - deepest green"),
+        ],
+    },
+    # NDRE (Normalized Difference Red Edge Index) - Sensitive to chlorophyll and nitrogen
+    'ndre': {
+        'bands': ["B05", "B06", "SCL"],
+        'expression': "(sample.B06 - sample.B05) / (sample.B06 + sample.B05)",
+        'mask_gray': 0.5,
+        'ramp': [
+            (0.1, (0.8, 0.4, 0.2), "Very low chlorophyll - brown"),
+            (0.2, (0.9, 0.6, 0.3), "Low chlorophyll - orange"),
+            (0.3, (0.9, 0.8, 0.4), "Moderate chlorophyll - yellow"),
+            (0.4, (0.6, 0.8, 0.3), "Good chlorophyll - light green"),
+            (0.5, (0.4, 0.7, 0.2), "High chlorophyll - green"),
+            (None, (0.2, 0.6, 0.1), "Very high chlorophyll - dark green"),
+        ],
+    },
+    # Moisture Index (NDMI) - Estimates water content in vegetation
+    'moisture': {
+        'bands': ["B08", "B11", "SCL"],
+        'expression': "(sample.B08 - sample.B11) / (sample.B08 + sample.B11)",
+        'mask_gray': 0.5,
+        'ramp': [
+            (-0.4, (0.8, 0.2, 0.1), "Very dry - red"),
+            (-0.2, (0.9, 0.5, 0.2), "Dry - orange"),
+            (0.0, (0.9, 0.8, 0.3), "Moderate moisture - yellow"),
+            (0.2, (0.4, 0.8, 0.6), "Good moisture - light blue"),
+            (0.4, (0.2, 0.6, 0.8), "High moisture - blue"),
+            (None, (0.1, 0.4, 0.9), "Very high moisture - dark blue"),
+        ],
+    },
+    # EVI (Enhanced Vegetation Index) - Better for high biomass areas
+    'evi': {
+        'bands': ["B02", "B04", "B08", "SCL"],
+        'expression': "2.5 * ((sample.B08 - sample.B04) / (sample.B08 + 6 * sample.B04 - 7.5 * sample.B02 + 1))",
+        'mask_gray': 0.5,
+        'ramp': [
+            (0.1, (0.7, 0.4, 0.2), "Very low vegetation - brown"),
+            (0.2, (0.8, 0.6, 0.3), "Low vegetation - tan"),
+            (0.3, (0.9, 0.8, 0.4), "Moderate vegetation - yellow"),
+            (0.4, (0.6, 0.8, 0.2), "Good vegetation - light green"),
+            (0.6, (0.4, 0.7, 0.1), "High vegetation - green"),
+            (None, (0.2, 0.5, 0.05), "Very high vegetation - dark green"),
+        ],
+    },
+    # NDWI (Normalized Difference Water Index) - Detects water presence
+    'ndwi': {
+        'bands': ["B03", "B08", "SCL"],
+        'expression': "(sample.B03 - sample.B08) / (sample.B03 + sample.B08)",
+        'mask_gray': 0.5,
+        'ramp': [
+            (-0.3, (0.6, 0.3, 0.1), "Very dry soil - brown"),
+            (-0.1, (0.8, 0.6, 0.4), "Dry soil - tan"),
+            (0.1, (0.7, 0.8, 0.6), "Moist soil - light green"),
+            (0.3, (0.4, 0.7, 0.8), "Wet areas - light blue"),
+            (0.5, (0.2, 0.5, 0.9), "Water bodies - blue"),
+            (None, (0.1, 0.3, 0.8), "Deep water - dark blue"),
+        ],
+    },
+    # Chlorophyll Index (CIrededge) - Tracks chlorophyll concentration
+    'chlorophyll': {
+        'bands': ["B05", "B07", "SCL"],
+        'expression': "(sample.B07 / sample.B05) - 1",
+        'mask_gray': 0.5,
+        'ramp': [
+            (0.5, (0.8, 0.2, 0.2), "Very low chlorophyll - red"),
+            (1.0, (0.9, 0.5, 0.1), "Low chlorophyll - orange"),
+            (1.5, (0.9, 0.8, 0.2), "Moderate chlorophyll - yellow"),
+            (2.0, (0.5, 0.8, 0.3), "Good chlorophyll - light green"),
+            (3.0, (0.3, 0.7, 0.2), "High chlorophyll - green"),
+            (None, (0.1, 0.5, 0.1), "Very high chlorophyll - dark green"),
+        ],
+    },
+}
+
+# True Color RGB satellite image for visual analysis
+_TRUE_COLOR_EVALSCRIPT = """
 //VERSION=3
 function setup() {
     return {
         input: [{
-            bands: ["B05", "B06", "SCL"],
+            bands: ["B04", "B03", "B02"],
             units: "DN"
         }],
         output: {
@@ -123,162 +209,252 @@ function setup() {
 }
 
 function evaluatePixel(sample) {
-    var ndre = (sample.B06 - sample.B05) / (sample.B06 + sample.B05);
+    // True color RGB: Red=B04, Green=B03, Blue=B02
+    // Apply atmospheric correction and enhance visibility
+    let gain = 2.5;
+    let gamma = 1.1;
+    
+    let r = Math.pow((sample.B04 * gain) / 10000, 1/gamma);
+    let g = Math.pow((sample.B03 * gain) / 10000, 1/gamma);
+    let b = Math.pow((sample.B02 * gain) / 10000, 1/gamma);
     
-    // Apply cloud masking
-    if (sample.SCL === 3 || sample.SCL === 8 || sample.SCL === 9 || sample.SCL === 10 || sample.SCL === 11) {
-        return [0.5, 0.5, 0.5]; // Gray for clouds/shadows
-    }
+    // Ensure values are in valid range
+    r = Math.max(0, Math.min(1, r));
+    g = Math.max(0, Math.min(1, g));
+    b = Math.max(0, Math.min(1, b));
     
-    // NDRE color mapping (enhanced for chlorophyll detection)
-    if (ndre < 0.1) return [0.8, 0.4, 0.2]; // Very low chlorophyll - brown
-    if (ndre < 0.2) return [0.9, 0.6, 0.3]; // Low chlorophyll - orange
-    if (ndre < 0.3) return [0.9, 0.8, 0.4]; // Moderate chlorophyll - yellow
-    if (ndre < 0.4) return [0.6, 0.8, 0.3]; // Good chlorophyll - light green
-    if (ndre < 0.5) return [0.4, 0.7, 0.2]; // High chlorophyll - green
-    return [0.2, 0.6, 0.1]; // Very high chlorophyll - dark green
+    return [r, g, b];
 }
 """
 
-    def get_moisture_evalscript(self) -> str:
-        """Moisture Index (NDMI) - Estimates water content in vegetation"""
-        return """
-//VERSION=3
-function setup() {
-    return {
-        input: [{
-            bands: ["B08", "B11", "SCL"],
-            units: "DN"
-        }],
-        output: {
-            bands: 3,
-            sampleType: "AUTO"
-        }
-    };
-}
 
-function evaluatePixel(sample) {
-    var ndmi = (sample.B08 - sample.B11) / (sample.B08 + sample.B11);
+def _render_evalscript(spec: dict) -> str:
+    """
+    Render an index spec from _INDEX_SPECS into a complete evalscript
     
-    // Apply cloud masking
-    if (sample.SCL === 3 || sample.SCL === 8 || sample.SCL === 9 || sample.SCL === 10 || sample.SCL === 11) {
-        return [0.5, 0.5, 0.5]; // Gray for clouds/shadows
-    }
+    Args:
+        spec: Dictionary with 'bands' and 'expression' entries
+        
+    Returns:
+        Evalscript source string
+    """
+    return _EVALSCRIPT_TEMPLATE.format(
+        bands=", ".join(f'"{band}"' for band in spec['bands']),
+        expression=spec['expression'],
+        masked=_INDEX_CODE_MASKED,
+        max_code=_INDEX_CODE_MAX,
+        offset=_INDEX_CODE_OFFSET,
+        scale=_INDEX_CODE_SCALE
+    )
+
+
+def _index_threshold_codes(thresholds: np.ndarray) -> np.ndarray:
+    """
+    Quantize ramp thresholds the way the evalscript quantizes index values
     
-    // NDMI color mapping (blue to red scale for moisture)
-    if (ndmi < -0.4) return [0.8, 0.2, 0.1]; // Very dry - red
-    if (ndmi < -0.2) return [0.9, 0.5, 0.2]; // Dry - orange
-    if (ndmi < 0.0) return [0.9, 0.8, 0.3]; // Moderate moisture - yellow
-    if (ndmi < 0.2) return [0.4, 0.8, 0.6]; // Good moisture - light blue
-    if (ndmi < 0.4) return [0.2, 0.6, 0.8]; // High moisture - blue
-    return [0.1, 0.4, 0.9]; // Very high moisture - dark blue
-}
-"""
+    Args:
+        thresholds: Ramp thresholds in index units
+        
+    Returns:
+        Integer codes; a pixel whose code equals one belongs to the class above it
+    """
+    return np.round((thresholds + _INDEX_CODE_OFFSET) * _INDEX_CODE_SCALE).astype(np.int64)
 
-    def get_evi_evalscript(self) -> str:
-        """EVI (Enhanced Vegetation Index) - Better for high biomass areas"""
-        return """
-//VERSION=3
-function setup() {
-    return {
-        input: [{
-            bands: ["B02", "B04", "B08", "SCL"],
-            units: "DN"
-        }],
-        output: {
-            bands: 3,
-            sampleType: "AUTO"
-        }
-    };
-}
 
-function evaluatePixel(sample) {
-    var evi = 2.5 * ((sample.B08 - sample.B04) / (sample.B08 + 6 * sample.B04 - 7.5 * sample.B02 + 1));
+@lru_cache(maxsize=None)
+def _index_color_lut(index_type: str) -> np.ndarray:
+    """
+    Build the RGBA lookup table that maps every UINT16 index code to its ramp color
     
-    // Apply cloud masking
-    if (sample.SCL === 3 || sample.SCL === 8 || sample.SCL === 9 || sample.SCL === 10 || sample.SCL === 11) {
-        return [0.5, 0.5, 0.5]; // Gray for clouds/shadows
-    }
+    Args:
+        index_type: Key into _INDEX_SPECS
+        
+    Returns:
+        uint8 array of shape (65536, 4)
+    """
+    spec = _INDEX_SPECS[index_type]
+    thresholds = np.array([threshold for threshold, _, _ in spec['ramp'][:-1]])
+    colors = np.array([color for _, color, _ in spec['ramp']])
     
-    // EVI color mapping (optimized for dense vegetation)
-    if (evi < 0.1) return [0.7, 0.4, 0.2]; // Very low vegetation - brown
-    if (evi < 0.2) return [0.8, 0.6, 0.3]; // Low vegetation - tan
-    if (evi < 0.3) return [0.9, 0.8, 0.4]; // Moderate vegetation - yellow
-    if (evi < 0.4) return [0.6, 0.8, 0.2]; // Good vegetation - light green
-    if (evi < 0.6) return [0.4, 0.7, 0.1]; // High vegetation - green
-    return [0.2, 0.5, 0.05]; // Very high vegetation - dark green
-}
-"""
+    # Same rule as the old per-pixel ladder: the first ramp entry with value < threshold wins.
+    # Binning happens in integer code space, since rebuilding values as code / SCALE - OFFSET
+    # lands some thresholds a hair below themselves (0.1 -> 0.0999...) and misclassifies them
+    threshold_codes = _index_threshold_codes(thresholds)
+    lut = np.empty((_INDEX_CODE_MAX + 1, 4), dtype=np.uint8)
+    lut[:, :3] = np.round(colors[np.digitize(np.arange(_INDEX_CODE_MAX + 1), threshold_codes)] * 255)
+    lut[_INDEX_CODE_MASKED, :3] = round(spec['mask_gray'] * 255)
+    lut[_INDEX_CODE_MAX, :3] = np.round(colors[-1] * 255)  # NaN falls through the ladder
+    lut[:, 3] = 255
+    return lut
 
-    def get_ndwi_evalscript(self) -> str:
-        """NDWI (Normalized Difference Water Index) - Detects water presence"""
-        return """
-//VERSION=3
-function setup() {
-    return {
-        input: [{
-            bands: ["B03", "B08", "SCL"],
-            units: "DN"
-        }],
-        output: {
-            bands: 3,
-            sampleType: "AUTO"
+
+def _colorize_index_image(image_bytes: bytes, index_type: str) -> np.ndarray:
+    """
+    Decode a quantized index PNG and color it through the index's lookup table
+    
+    Args:
+        image_bytes: Single-band 16-bit PNG returned by the index evalscript
+        index_type: Key into _INDEX_SPECS
+        
+    Returns:
+        RGBA uint8 array of shape (height, width, 4)
+    """
+    codes = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if codes is None:
+        raise ValueError("Could not decode index image")
+    if codes.ndim == 3:
+        codes = codes[..., 0]
+    return _index_color_lut(index_type)[codes.astype(np.uint16, copy=False)]
+
+
+# Rendered once at import; get_evalscript is a plain dict lookup
+_EVALSCRIPTS = {index_type: _render_evalscript(spec) for index_type, spec in _INDEX_SPECS.items()}
+_EVALSCRIPTS['true_color'] = _TRUE_COLOR_EVALSCRIPT
+
+
+@lru_cache(maxsize=4)
+def _data_sources_for_day(epoch_day: int) -> List[dict]:
+    """
+    Build the Sentinel-2 data block for the 30-day acquisition window ending on the given UTC day
+    
+    The result is shared between requests made on the same day and must not be mutated.
+    
+    Args:
+        epoch_day: Days since the Unix epoch (UTC)
+        
+    Returns:
+        List for the Process API input.data field
+    """
+    end_date = datetime(1970, 1, 1) + timedelta(days=epoch_day)
+    start_date = end_date - timedelta(days=30)
+    return [{
+        "type": "sentinel-2-l2a",
+        "dataFilter": {
+            "timeRange": {
+                "from": start_date.strftime("%Y-%m-%dT00:00:00Z"),
+                "to": end_date.strftime("%Y-%m-%dT23:59:59Z")
+            },
+            "maxCloudCoverage": 20
         }
-    };
-}
+    }]
 
-function evaluatePixel(sample) {
-    var ndwi = (sample.B03 - sample.B08) / (sample.B03 + sample.B08);
+
+def _decode_png(image_bytes: bytes) -> np.ndarray:
+    """
+    Decode PNG bytes straight into an RGBA pixel array
     
-    // Apply cloud masking
-    if (sample.SCL === 3 || sample.SCL === 8 || sample.SCL === 9 || sample.SCL === 10 || sample.SCL === 11) {
-        return [0.5, 0.5, 0.5]; // Gray for clouds/shadows
-    }
+    Uses pyspng when it is installed and OpenCV's SIMD decoder otherwise; Pillow is only
+    the last resort for unusual layouts (grayscale, 16-bit).
     
-    // NDWI color mapping (blue scale for water detection)
-    if (ndwi < -0.3) return [0.6, 0.3, 0.1]; // Very dry soil - brown
-    if (ndwi < -0.1) return [0.8, 0.6, 0.4]; // Dry soil - tan
-    if (ndwi < 0.1) return [0.7, 0.8, 0.6]; // Moist soil - light green
-    if (ndwi < 0.3) return [0.4, 0.7, 0.8]; // Wet areas - light blue
-    if (ndwi < 0.5) return [0.2, 0.5, 0.9]; // Water bodies - blue
-    return [0.1, 0.3, 0.8]; // Deep water - dark blue
-}
-"""
+    Args:
+        image_bytes: PNG image bytes
+        
+    Returns:
+        uint8 array of shape (height, width, 4)
+    """
+    if pyspng is not None:
+        pixels = pyspng.load(image_bytes)
+        if pixels.dtype == np.uint8 and pixels.ndim == 3:
+            if pixels.shape[2] == 4:
+                return pixels
+            if pixels.shape[2] == 3:
+                return cv2.cvtColor(pixels, cv2.COLOR_RGB2RGBA)
+    
+    # OpenCV expands palette images and returns BGR(A) channel order
+    pixels = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if pixels is not None and pixels.dtype == np.uint8 and pixels.ndim == 3:
+        if pixels.shape[2] == 4:
+            return cv2.cvtColor(pixels, cv2.COLOR_BGRA2RGBA)
+        if pixels.shape[2] == 3:
+            return cv2.cvtColor(pixels, cv2.COLOR_BGR2RGBA)
+    
+    img = Image.open(BytesIO(image_bytes))
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    return np.asarray(img)
 
-    def get_chlorophyll_evalscript(self) -> str:
-        """Chlorophyll Index (CIrededge) - Tracks chlorophyll concentration"""
-        return """
-//VERSION=3
-function setup() {
-    return {
-        input: [{
-            bands: ["B05", "B07", "SCL"],
-            units: "DN"
-        }],
-        output: {
-            bands: 3,
-            sampleType: "AUTO"
-        }
-    };
-}
 
-function evaluatePixel(sample) {
-    var cire = (sample.B07 / sample.B05) - 1;
+def _polygon_bbox_coverage(bbox: List[float], coordinates: List[List[float]]) -> float:
+    """
+    Fraction of the bounding box covered by a polygon ring (shoelace formula)
     
-    // Apply cloud masking
-    if (sample.SCL === 3 || sample.SCL === 8 || sample.SCL === 9 || sample.SCL === 10 || sample.SCL === 11) {
-        return [0.5, 0.5, 0.5]; // Gray for clouds/shadows
-    }
+    The geo-to-pixel mapping is linear, so this is also the fraction of image pixels
+    the polygon mask would keep.
     
-    // Chlorophyll index color mapping (green scale for chlorophyll content)
-    if (cire < 0.5) return [0.8, 0.2, 0.2]; // Very low chlorophyll - red
-    if (cire < 1.0) return [0.9, 0.5, 0.1]; // Low chlorophyll - orange
-    if (cire < 1.5) return [0.9, 0.8, 0.2]; // Moderate chlorophyll - yellow
-    if (cire < 2.0) return [0.5, 0.8, 0.3]; // Good chlorophyll - light green
-    if (cire < 3.0) return [0.3, 0.7, 0.2]; // High chlorophyll - green
-    return [0.1, 0.5, 0.1]; // Very high chlorophyll - dark green
-}
-"""
+    Args:
+        bbox: Bounding box coordinates [min_lng, min_lat, max_lng, max_lat]
+        coordinates: Polygon ring as [lng, lat] pairs
+        
+    Returns:
+        Covered fraction of the bbox area
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    coords = np.asarray(coordinates, dtype=np.float64)[:, :2]
+    x = (coords[:, 0] - min_lng) / (max_lng - min_lng)
+    y = (coords[:, 1] - min_lat) / (max_lat - min_lat)
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def _encode_png(pixels: np.ndarray, strategy: int = cv2.IMWRITE_PNG_STRATEGY_DEFAULT) -> bytes:
+    """
+    Encode RGBA pixels as a fast, lightly compressed PNG
+    
+    Args:
+        pixels: RGBA uint8 array of shape (height, width, 4)
+        strategy: zlib strategy; IMWRITE_PNG_STRATEGY_RLE is much cheaper for
+            flat-color images such as LUT-colored index maps
+        
+    Returns:
+        PNG image bytes
+    """
+    # OpenCV expects BGRA channel order
+    ok, encoded = cv2.imencode('.png', cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGRA),
+                               [cv2.IMWRITE_PNG_COMPRESSION, 1, cv2.IMWRITE_PNG_STRATEGY, strategy])
+    if not ok:
+        raise ValueError("PNG encoding failed")
+    return encoded.tobytes()
+
+
+class NDVIFetcher:
+    """Handles NDVI data fetching from Sentinel Hub API"""
+    
+    def __init__(self, auth_handler: SentinelHubAuth):
+        """
+        Initialize NDVI fetcher
+        
+        Args:
+            auth_handler: Configured SentinelHubAuth instance
+        """
+        self.auth = auth_handler
+        self.process_url = "https://services.sentinel-hub.com/api/v1/process"
+        # Pooled keep-alive connections skip a TLS handshake on every request after the first
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=frozenset({"POST"}),
+                raise_on_status=False
+            )
+        ))
+        # Finished images keyed by a hash of the request body -> (fetched_at, bytes)
+        self._image_cache: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()
+        self._image_cache_lock = threading.Lock()
+    
+    def get_evalscript(self, index_type: str) -> str:
+        """
+        Return the evalscript for calculating different vegetation indices
+        
+        Args:
+            index_type: Type of vegetation index ('ndvi', 'ndre', 'moisture', 'evi', 'ndwi', 'chlorophyll', 'true_color')
+            
+        Returns:
+            Evalscript string for the specified index calculation
+        """
+        return _EVALSCRIPTS.get(index_type, _EVALSCRIPTS['ndvi'])  # Default to NDVI
     
     def create_request_payload(self, bbox: List[float], width: int = 2500, height: int = 2500, geometry: Optional[dict] = None, index_type: str = 'ndvi') -> dict:
         """
@@ -293,55 +469,25 @@ function evaluatePixel(sample) {
         Returns:
             Dictionary containing the complete request payload
         """
-        # Calculate time range (last 30 days)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        # Use field geometry if provided, otherwise use bounding box
+        # Sentinel Hub accepts a bare bbox, so only send a polygon when we have a real field geometry
+        bounds = {
+            "properties": _WGS84_PROPERTIES,
+            "bbox": bbox
+        }
         if geometry and geometry.get('type') == 'Polygon':
-            bounds_geometry = geometry
-        else:
-            # Fall back to bounding box rectangle
-            bounds_geometry = {
-                "type": "Polygon",
-                "coordinates": [[
-                    [bbox[0], bbox[1]],  # min_lng, min_lat
-                    [bbox[2], bbox[1]],  # max_lng, min_lat
-                    [bbox[2], bbox[3]],  # max_lng, max_lat
-                    [bbox[0], bbox[3]],  # min_lng, max_lat
-                    [bbox[0], bbox[1]]   # close polygon
-                ]]
-            }
+            bounds["geometry"] = geometry
         
+        # Only bounds and size vary per request; the data block (last 30 days) is built once
+        # per day and the responses block and evalscript are shared module constants
         return {
             "input": {
-                "bounds": {
-                    "geometry": bounds_geometry,
-                    "properties": {
-                        "crs": "http://www.opengis.net/def/crs/EPSG/0/4326"
-                    },
-                    "bbox": bbox
-                },
-                "data": [{
-                    "type": "sentinel-2-l2a",
-                    "dataFilter": {
-                        "timeRange": {
-                            "from": start_date.strftime("%Y-%m-%dT00:00:00Z"),
-                            "to": end_date.strftime("%Y-%m-%dT23:59:59Z")
-                        },
-                        "maxCloudCoverage": 20
-                    }
-                }]
+                "bounds": bounds,
+                "data": _data_sources_for_day(int(time.time() // 86400))
             },
             "output": {
                 "width": width,
                 "height": height,
-                "responses": [{
-                    "identifier": "default",
-                    "format": {
-                        "type": "image/png"
-                    }
-                }]
+                "responses": _PNG_RESPONSES
             },
             "evalscript": self.get_evalscript(index_type)
         }
@@ -381,15 +527,25 @@ function evaluatePixel(sample) {
             width, height = self._calculate_optimal_dimensions(bbox)
         
         logger.info(f"Using image dimensions: {width}x{height} for bbox: {bbox}")
+        
+        # Create request payload with calculated dimensions and geometry
+        payload = self.create_request_payload(bbox, width, height, geometry, index_type)
+        body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode('utf-8')
+        
+        # The payload pins bbox, geometry, size, evalscript and the day's time range,
+        # so an identical body means an identical image
+        cache_key = hashlib.blake2b(body, digest_size=16).digest()
+        cached = self._get_cached_image(cache_key)
+        if cached is not None:
+            logger.info(f"Serving cached {index_type.upper()} image for bbox: {bbox}")
+            return cached
+        
         # Get access token
         token = self.auth.get_access_token()
         if not token:
             logger.error("Failed to obtain access token")
             return None
         
-        # Create request payload with calculated dimensions and geometry
-        payload = self.create_request_payload(bbox, width, height, geometry, index_type)
-        
         headers = {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json',
@@ -398,29 +554,125 @@ function evaluatePixel(sample) {
         
         try:
             logger.info(f"Requesting {index_type.upper()} image for bbox: {bbox}")
-            response = requests.post(
+            with self.session.post(
                 self.process_url,
-                json=payload,
+                data=body,
                 headers=headers,
-                timeout=60
-            )
+                timeout=60,
+                stream=True
+            ) as response:
+                # Read the body in a single call instead of letting requests join it
+                # from 10 KB chunks, which briefly holds two copies of a multi-MB PNG
+                content = response.raw.read(decode_content=True)
+                status_code = response.status_code
             
-            if response.status_code == 200:
-                logger.info(f"Successfully fetched {index_type.upper()} image ({len(response.content)} bytes)")
+            if status_code == 200:
+                logger.info(f"Successfully fetched {index_type.upper()} image ({len(content)} bytes)")
                 
-                # Apply polygon masking if geometry is provided
-                if geometry:
-                    return self._apply_polygon_mask(response.content, bbox, geometry, width, height)
+                if index_type == 'true_color':
+                    # Apply polygon masking if geometry is provided
+                    image = content
+                    if geometry:
+                        image = self._apply_polygon_mask(image, bbox, geometry, width, height)
+                else:
+                    image = self._render_index_image(content, index_type, bbox, geometry)
+                    if image is None:
+                        return None
                 
-                return response.content
+                self._store_cached_image(cache_key, image)
+                return image
             else:
-                logger.error(f"Failed to fetch NDVI image: {response.status_code} - {response.text}")
+                logger.error(f"Failed to fetch NDVI image: {status_code} - {content.decode('utf-8', errors='replace')}")
                 return None
                 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
             logger.error(f"Error fetching NDVI image: {e}")
             return None
     
+    def _get_cached_image(self, cache_key: bytes) -> Optional[bytes]:
+        """
+        Look up a previously fetched image, dropping it if it has expired
+        
+        Args:
+            cache_key: Hash of the Process API request body
+            
+        Returns:
+            Cached PNG image bytes or None on a miss
+        """
+        with self._image_cache_lock:
+            entry = self._image_cache.get(cache_key)
+            if entry is None:
+                return None
+            fetched_at, image = entry
+            if time.time() - fetched_at > IMAGE_CACHE_TTL_SECONDS:
+                del self._image_cache[cache_key]
+                return None
+            self._image_cache.move_to_end(cache_key)
+            return image
+    
+    def _store_cached_image(self, cache_key: bytes, image: bytes):
+        """
+        Remember a fetched image, evicting the least recently used entries when full
+        
+        Args:
+            cache_key: Hash of the Process API request body
+            image: PNG image bytes returned to the caller
+        """
+        with self._image_cache_lock:
+            self._image_cache[cache_key] = (time.time(), image)
+            self._image_cache.move_to_end(cache_key)
+            while len(self._image_cache) > IMAGE_CACHE_MAX_ENTRIES:
+                self._image_cache.popitem(last=False)
+    
+    def fetch_vegetation_index_images(self, bbox: List[float], index_types: List[str], geometry: Optional[dict] = None) -> Dict[str, Optional[bytes]]:
+        """
+        Fetch several vegetation index images for the same area concurrently
+        
+        Args:
+            bbox: Bounding box coordinates [min_lng, min_lat, max_lng, max_lat] in EPSG:4326
+            index_types: Vegetation index types to fetch (see fetch_vegetation_index_image)
+            geometry: Optional GeoJSON geometry for polygon masking
+            
+        Returns:
+            Dictionary mapping each index type to its PNG image bytes, or None if that fetch failed
+        """
+        return self.fetch_vegetation_index_batch({
+            index_type: (bbox, index_type, geometry) for index_type in index_types
+        })
+    
+    def fetch_vegetation_index_batch(self, jobs: Dict[Hashable, Tuple[List[float], str, Optional[dict]]]) -> Dict[Hashable, Optional[bytes]]:
+        """
+        Fetch many vegetation index images (e.g. across several fields) in one batch
+        
+        Each request is network-bound, so they are issued in parallel threads and the
+        total wait is roughly the slowest request per round instead of the sum of all of
+        them. Concurrency is capped to stay within Sentinel Hub rate limits.
+        
+        Args:
+            jobs: Dictionary mapping a caller-chosen key (field id, index type, ...) to a
+                (bbox, index_type, geometry) tuple
+            
+        Returns:
+            Dictionary mapping each key to its PNG image bytes, or None if that fetch failed
+        """
+        if not jobs:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=min(len(jobs), MAX_CONCURRENT_REQUESTS)) as executor:
+            futures = {
+                key: executor.submit(self.fetch_vegetation_index_image, bbox, index_type, geometry=geometry)
+                for key, (bbox, index_type, geometry) in jobs.items()
+            }
+        
+        images = {}
+        for key, future in futures.items():
+            try:
+                images[key] = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching vegetation index image for {key}: {e}")
+                images[key] = None
+        return images
+    
     def validate_bbox(self, bbox: List[float]) -> bool:
         """
         Validate bounding box coordinates
@@ -436,21 +688,18 @@ function evaluatePixel(sample) {
         
         min_lng, min_lat, max_lng, max_lat = bbox
         
-        # Check coordinate ranges
-        if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
-            return False
-        if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90):
-            return False
-        
-        # Check bbox is properly ordered
-        if min_lng >= max_lng or min_lat >= max_lat:
-            return False
+        # Coordinate ranges and ordering folded into a single combined check
+        is_valid = bool(
+            (min_lng >= -180) & (max_lng <= 180) &
+            (min_lat >= -90) & (max_lat <= 90) &
+            (min_lng < max_lng) & (min_lat < max_lat)
+        )
         
         # Check bbox is not too large (max 0.5 degrees for demo)
-        if (max_lng - min_lng) > 0.5 or (max_lat - min_lat) > 0.5:
+        if is_valid and ((max_lng - min_lng) > 0.5 or (max_lat - min_lat) > 0.5):
             logger.warning("Bounding box is quite large, consider reducing size for better performance")
         
-        return True
+        return is_valid
     
     def _calculate_optimal_dimensions(self, bbox: List[float]) -> tuple:
         """
@@ -480,32 +729,52 @@ function evaluatePixel(sample) {
         width_meters = lng_diff * meters_per_deg_lng
         height_meters = lat_diff * meters_per_deg_lat
         
-        # Calculate aspect ratio
-        aspect_ratio = width_meters / height_meters
-        
-        # Target maximum dimension for high resolution
+        # Scale the longer side to the maximum dimension; the shorter side keeps the aspect ratio
         max_dimension = 2500
+        scale = max_dimension / max(width_meters, height_meters)
         
-        if aspect_ratio > 1:
-            # Wider than tall
-            width = max_dimension
-            height = int(max_dimension / aspect_ratio)
-        else:
-            # Taller than wide
-            height = max_dimension
-            width = int(max_dimension * aspect_ratio)
-        
-        # Ensure minimum dimensions for quality
-        width = max(width, 512)
-        height = max(height, 512)
-        
-        # Ensure maximum dimensions don't exceed API limits
-        width = min(width, 2500)
-        height = min(height, 2500)
+        # Clamp to minimum dimensions for quality and maximum API limits
+        width = min(max_dimension, max(512, round(width_meters * scale)))
+        height = min(max_dimension, max(512, round(height_meters * scale)))
         
         return width, height
     
-    def _apply_polygon_mask(self, image_bytes: bytes, bbox: List[float], geometry: dict, width: int, height: int) -> bytes:
+    def _render_index_image(self, image_bytes: bytes, index_type: str, bbox: List[float], geometry: Optional[dict] = None) -> Optional[bytes]:
+        """
+        Color a quantized vegetation index image and apply the polygon mask in one pass
+        
+        Args:
+            image_bytes: Single-band 16-bit PNG returned by the index evalscript
+            index_type: Vegetation index type (unknown types were fetched as NDVI)
+            bbox: Bounding box coordinates [min_lng, min_lat, max_lng, max_lat]
+            geometry: Optional GeoJSON geometry for polygon masking
+            
+        Returns:
+            Colored PNG image bytes or None if the image could not be processed
+        """
+        try:
+            if index_type not in _INDEX_SPECS:
+                index_type = 'ndvi'
+            pixels = _colorize_index_image(image_bytes, index_type)
+            
+            if geometry:
+                if geometry.get('type') == 'Polygon':
+                    coordinates = geometry['coordinates'][0]
+                    if _polygon_bbox_coverage(bbox, coordinates) < FULL_COVERAGE_RATIO:
+                        pixels = self._mask_polygon_pixels(pixels, bbox, coordinates)
+                        logger.info("Successfully applied polygon mask to NDVI image")
+                else:
+                    logger.warning("Geometry is not a polygon, skipping mask")
+            
+            # Index maps are runs of a dozen ramp colors plus transparent surroundings,
+            # which run-length matching compresses about as well as a full deflate search
+            return _encode_png(pixels, cv2.IMWRITE_PNG_STRATEGY_RLE)
+            
+        except Exception as e:
+            logger.error(f"Error rendering {index_type.upper()} image: {e}")
+            return None
+    
+    def _apply_polygon_mask(self, image_bytes: bytes, bbox: List[float], geometry: dict, width: int, height: int, mask_downsample: int = 4) -> bytes:
         """
         Apply polygon masking to NDVI image to show data only within selected polygon
         
@@ -515,98 +784,74 @@ function evaluatePixel(sample) {
             geometry: GeoJSON geometry containing polygon coordinates
             width: Image width in pixels
             height: Image height in pixels
+            mask_downsample: Factor to shrink the mask by while rasterizing; the mask is
+                bilinearly upscaled afterwards, which also anti-aliases the field edge
             
         Returns:
             Masked image bytes
         """
         try:
-            # Load the original image
-            img = Image.open(BytesIO(image_bytes))
-            original_width, original_height = img.size
-            
-            # Use the actual image dimensions instead of the requested dimensions
-            # This preserves the original image quality
-            width, height = original_width, original_height
-            
-            # Convert to RGBA for transparency support
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Create a high-quality mask with anti-aliasing
-            mask = Image.new('L', (width, height), 0)
-            draw = ImageDraw.Draw(mask)
-            
-            # Extract polygon coordinates
+            # Extract polygon coordinates before paying for the decode
             if geometry.get('type') == 'Polygon':
                 coordinates = geometry['coordinates'][0]  # First ring (exterior)
             else:
                 logger.warning("Geometry is not a polygon, skipping mask")
                 return image_bytes
             
-            # Convert geo coordinates to pixel coordinates with higher precision
-            min_lng, min_lat, max_lng, max_lat = bbox
-            pixel_coords = []
-            
-            for coord in coordinates:
-                lng, lat = coord
-                # Convert to pixel coordinates with float precision
-                x = ((lng - min_lng) / (max_lng - min_lng)) * width
-                y = ((max_lat - lat) / (max_lat - min_lat)) * height
-                pixel_coords.append((x, y))
-            
-            # Draw the polygon mask with anti-aliasing
-            draw.polygon(pixel_coords, fill=255)
-            
-            # Apply mask using paste method for better quality preservation
-            # Create a transparent background
-            result = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            
-            # Use the mask to composite the original image onto transparent background
-            result.paste(img, (0, 0), mask)
+            # A field that fills its own bbox would get an all-opaque mask
+            if _polygon_bbox_coverage(bbox, coordinates) >= FULL_COVERAGE_RATIO:
+                return image_bytes
             
-            # Save to bytes with high quality
-            output = BytesIO()
-            result.save(output, format='PNG', optimize=False, compress_level=1)
+            # Decode the original image as RGBA for transparency support
+            pixels = _decode_png(image_bytes)
+            result = self._mask_polygon_pixels(pixels, bbox, coordinates, mask_downsample)
             
             logger.info("Successfully applied polygon mask to NDVI image")
-            return output.getvalue()
+            return _encode_png(result)
             
         except Exception as e:
             logger.error(f"Error applying polygon mask: {e}")
             return image_bytes  # Return original on error
-
-    def get_true_color_evalscript(self) -> str:
-        """True Color RGB satellite image for visual analysis"""
-        return """
-//VERSION=3
-function setup() {
-    return {
-        input: [{
-            bands: ["B04", "B03", "B02"],
-            units: "DN"
-        }],
-        output: {
-            bands: 3,
-            sampleType: "AUTO"
-        }
-    };
-}
-
-function evaluatePixel(sample) {
-    // True color RGB: Red=B04, Green=B03, Blue=B02
-    // Apply atmospheric correction and enhance visibility
-    let gain = 2.5;
-    let gamma = 1.1;
-    
-    let r = Math.pow((sample.B04 * gain) / 10000, 1/gamma);
-    let g = Math.pow((sample.B03 * gain) / 10000, 1/gamma);
-    let b = Math.pow((sample.B02 * gain) / 10000, 1/gamma);
-    
-    // Ensure values are in valid range
-    r = Math.max(0, Math.min(1, r));
-    g = Math.max(0, Math.min(1, g));
-    b = Math.max(0, Math.min(1, b));
     
-    return [r, g, b];
-}
-        """
\ No newline at end of file
+    def _mask_polygon_pixels(self, pixels: np.ndarray, bbox: List[float], coordinates: List[List[float]], mask_downsample: int = 4) -> np.ndarray:
+        """
+        Make every pixel outside the polygon transparent, modifying pixels in place
+        
+        Args:
+            pixels: RGBA uint8 array of shape (height, width, 4)
+            bbox: Bounding box coordinates [min_lng, min_lat, max_lng, max_lat]
+            coordinates: Exterior ring of the polygon as [lng, lat] pairs
+            mask_downsample: Factor to shrink the mask by while rasterizing
+            
+        Returns:
+            The same array, masked
+        """
+        # Use the actual image dimensions instead of the requested dimensions
+        # This preserves the original image quality
+        height, width = pixels.shape[:2]
+        
+        # Rasterize the mask at reduced resolution; field outlines are piecewise linear,
+        # so the bilinear upscale below restores smooth, anti-aliased edges
+        mask_width = max(1, width // mask_downsample)
+        mask_height = max(1, height // mask_downsample)
+        mask = np.zeros((mask_height, mask_width), dtype=np.uint8)
+        
+        # Convert geo coordinates to pixel coordinates for all vertices at once
+        min_lng, min_lat, max_lng, max_lat = bbox
+        coords = np.asarray(coordinates, dtype=np.float64)[:, :2]
+        pixel_coords = np.empty_like(coords)
+        pixel_coords[:, 0] = (coords[:, 0] - min_lng) * (mask_width / (max_lng - min_lng))
+        pixel_coords[:, 1] = (max_lat - coords[:, 1]) * (mask_height / (max_lat - min_lat))
+        
+        # Fill the polygon in one OpenCV call; vertices are passed as 28.4 fixed point
+        # so sub-pixel positions survive, and LINE_AA anti-aliases the outline
+        pts = np.round(pixel_coords * _FILL_POLY_SCALE).astype(np.int32).reshape(-1, 1, 2)
+        cv2.fillPoly(mask, [pts], 255, lineType=cv2.LINE_AA, shift=_FILL_POLY_SHIFT)
+        if (mask_width, mask_height) != (width, height):
+            mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_LINEAR)
+        
+        # Color passes through untouched; the mask only lowers alpha, so there is no
+        # per-channel blend (the imagery is opaque, making this alpha = mask). One
+        # vectorized pass, written in place over the freshly decoded pixels
+        np.minimum(pixels[..., 3], mask, out=pixels[..., 3])
+        return pixels
@@ -1,26 +1,250 @@
-from flask import render_template, request, jsonify, flash, redirect, url_for, Response, render_template_string
+from flask import render_template, request, jsonify, flash, redirect, url_for, Response, render_template_string, send_file, abort, make_response
 from app import app, db
-from models import Field, FieldAnalysis
+from models import Field, FieldAnalysis, MonitoringSettings, load_json_text
 from utils.sentinel_hub import fetch_ndvi_image
 from utils.ndvi_processor import process_ndvi_data, calculate_field_zones
-from utils.ai_recommendations import generate_recommendations
+from utils.ndvi_analyzer import NDVIAnalyzer, analyze_field_ndvi
+from utils.ai_recommendations import generate_recommendations, get_zone_ndvi_values
 from utils.weather_service import WeatherService
 from utils.ai_field_analyzer import AIFieldAnalyzer
+from utils.visual_field_analyzer import VisualFieldAnalyzer
+from utils.ttl_cache import TTLCache
 from auth import SentinelHubAuth
 from ndvi_fetcher import NDVIFetcher
+import glob
+import hashlib
 import logging
 import json
-from datetime import datetime
+import os
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.orm import load_only, raiseload, selectinload
 
 # Initialize satellite functionality
 logger = logging.getLogger(__name__)
 auth_handler = SentinelHubAuth()
 ndvi_fetcher = NDVIFetcher(auth_handler)
 
+# Zone NDVI upper bounds for each health label (bins are right-inclusive)
+HEALTH_SCORE_THRESHOLDS = np.array([0.3, 0.6])
+HEALTH_SCORE_LABELS = np.array(['stressed', 'moderate', 'healthy'])
+
+# Analyses returned per /field/<id>/history page; older pages are requested with ?before=<cursor>
+HISTORY_PAGE_SIZE = 50
+
+# Cached field images are immutable per ETag but revalidated daily
+CACHED_PNG_CACHE_CONTROL = 'public, max-age=86400, must-revalidate'
+
+# On-disk copies of cached field images, named by their ETag and served with sendfile
+IMAGE_FILE_CACHE_DIR = os.path.join(app.instance_path, 'image_cache')
+
+def template_version():
+    """
+    Hash the contents of every template
+    
+    The same templates give the same token in every worker and across restarts, and a deploy
+    that edits any of them gives a new one.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    for root, _, files in sorted(os.walk(template_dir)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, template_dir).encode('utf-8'))
+            with open(path, 'rb') as template_file:
+                digest.update(template_file.read())
+    return digest.hexdigest()
+
+# Field pages are revalidated against their data; the template version retires old
+# ETags whenever a deploy changes how the pages render
+FIELD_PAGE_ETAG_VERSION = template_version()
+FIELD_PAGE_IMAGE_TYPES = ('ndvi', 'rgb', 'ndre', 'moisture', 'evi', 'ndwi', 'chlorophyll')
+
+# Background field analyses started with /api/analyze_field?async=1, keyed by task id.
+# Bounded and expiring, so tasks nobody polls are dropped: a pending task is kept for
+# ANALYSIS_TASK_TTL_SECONDS, and a finished one for ANALYSIS_RESULT_GRACE_SECONDS more
+analysis_executor = ThreadPoolExecutor(max_workers=4)
+ANALYSIS_TASK_TTL_SECONDS = 60 * 60
+ANALYSIS_RESULT_GRACE_SECONDS = 10 * 60
+analysis_tasks = TTLCache(maxsize=256)
+
+# Network lookups a request starts early and collects later (e.g. weather during visual analysis)
+lookup_executor = ThreadPoolExecutor(max_workers=4)
+
 def is_ajax_request():
     """Check if the current request is an AJAX request"""
     return request.args.get('ajax') == '1'
 
+def png_response(image_data, max_age, filename=None, etag=None):
+    """
+    Build a PNG response tagged with an ETag
+    
+    Answers 304 Not Modified when the client's If-None-Match already holds the same image,
+    so repeat views skip the multi-megabyte body.
+    
+    Args:
+        image_data: PNG bytes
+        max_age: Cache-Control max-age in seconds
+        filename: Optional inline filename for Content-Disposition
+        etag: ETag to send, e.g. Field.get_cache_etag() for cached images; when omitted the
+            bytes are hashed, so pass one whenever the image has a cheaper version token
+    """
+    headers = {'Cache-Control': f'public, max-age={max_age}'}
+    if filename:
+        headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    response = Response(image_data, mimetype='image/png', headers=headers)
+    response.set_etag(etag or hashlib.blake2b(image_data, digest_size=16).hexdigest())
+    return response.make_conditional(request)
+
+def cached_png_response(field, index_type, filename):
+    """
+    Serve a field's cached image with an ETag and Last-Modified derived from when it was cached
+    
+    A matching If-None-Match (or, without one, a current If-Modified-Since) is answered
+    with 304 before the image bytes are touched.
+    """
+    etag = field.get_cache_etag(index_type)
+    cache_date = getattr(field, f'{index_type}_cache_date', None)
+    last_modified = cache_date.replace(tzinfo=timezone.utc, microsecond=0) if cache_date else None
+    
+    if request.if_none_match:
+        not_modified = bool(etag) and request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since) and last_modified <= request.if_modified_since
+    
+    if not_modified:
+        # A 304 carries no body, so it needs no Content-Disposition
+        response = Response(status=304, headers={'Cache-Control': CACHED_PNG_CACHE_CONTROL})
+    else:
+        headers = {
+            'Content-Disposition': f'inline; filename="{filename}"',
+            'Cache-Control': CACHED_PNG_CACHE_CONTROL
+        }
+        image_path = cached_png_file(field, index_type, etag) if etag else None
+        if image_path:
+            # send_file streams from disk via sendfile and answers Range requests itself
+            response = send_file(image_path, mimetype='image/png', conditional=True, etag=False)
+            response.headers.update(headers)
+        else:
+            response = Response(field.get_cached_vegetation_index_image(index_type), mimetype='image/png', headers=headers)
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+def cached_png_file(field, index_type, etag):
+    """
+    Get the path of a field's cached image on disk, writing it from the database on first use
+    
+    Files are named by ETag, so a re-cached image gets a new file and older copies are removed.
+    
+    Returns:
+        File path, or None if the image is missing or the cache directory is not writable
+    """
+    image_path = os.path.join(IMAGE_FILE_CACHE_DIR, f"{etag}.png")
+    if os.path.exists(image_path):
+        return image_path
+    
+    image_data = field.get_cached_vegetation_index_image(index_type)
+    if not image_data:
+        return None
+    try:
+        os.makedirs(IMAGE_FILE_CACHE_DIR, exist_ok=True)
+        remove_cached_png_files(f"{field.id}-{index_type}-*")
+        temp_path = f"{image_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as image_file:
+            image_file.write(image_data)
+        os.replace(temp_path, image_path)
+        return image_path
+    except OSError as e:
+        logging.warning(f"Could not write image cache file for field {field.id}: {e}")
+        return None
+
+def remove_cached_png_files(pattern):
+    """Remove on-disk cached images whose file names match a glob pattern"""
+    for path in glob.glob(os.path.join(IMAGE_FILE_CACHE_DIR, f"{pattern}.png")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def load_json_column(value, empty):
+    """Parse a stored JSON text column like the FieldAnalysis getters do, returning empty when unset"""
+    if not value:
+        return empty
+    return load_json_text(value)
+
+def strict_load_options(*options):
+    """
+    Loader options for list and detail views
+    
+    Under TESTING or debug mode, any relationship the view did not load up front raises
+    instead of lazily issuing its own query, so new template code cannot quietly add N+1 queries.
+    """
+    if app.config.get('TESTING') or app.debug:
+        return (*options, raiseload('*', sql_only=True))
+    return options
+
+def get_field_with_latest_analysis(field_id):
+    """
+    Load a field and its most recent analysis in a single query, aborting with 404 if the field is missing
+    
+    Returns:
+        Tuple of (Field, latest FieldAnalysis or None)
+    """
+    latest_analysis_id = (
+        select(FieldAnalysis.id)
+        .where(FieldAnalysis.field_id == Field.id)
+        .order_by(FieldAnalysis.analysis_date.desc())
+        .limit(1)
+        .correlate(Field)
+        .scalar_subquery()
+    )
+    row = db.session.execute(
+        select(Field, FieldAnalysis)
+        .options(*strict_load_options())
+        .outerjoin(FieldAnalysis, FieldAnalysis.id == latest_analysis_id)
+        .where(Field.id == field_id)
+    ).first()
+    if row is None:
+        abort(404)
+    return row[0], row[1]
+
+def field_page_etag(field, latest_analysis, analysis_count=None):
+    """
+    Build a weak ETag for an HTML field page from the data it renders
+    
+    Args:
+        field: Field shown on the page
+        latest_analysis: Most recent FieldAnalysis, or None
+        analysis_count: Number of analyses listed on the page, if it lists them
+    
+    Returns:
+        ETag string
+    """
+    cache_dates = '|'.join(str(getattr(field, f'{index_type}_cache_date')) for index_type in FIELD_PAGE_IMAGE_TYPES)
+    version = (
+        f"{FIELD_PAGE_ETAG_VERSION}|{field.id}|{field.name}|{field.polygon_data}|{field.last_analyzed}|{cache_dates}|"
+        f"{getattr(latest_analysis, 'id', '')}|{getattr(latest_analysis, 'analysis_date', '')}|{analysis_count}"
+    )
+    return hashlib.blake2b(version.encode('utf-8'), digest_size=16).hexdigest()
+
+def render_conditional_template(etag, template_name, **context):
+    """
+    Render a template tagged with a weak ETag, or answer 304 without rendering when the client has it
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render_template(template_name, **context))
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 def render_spa_template(template_name, **context):
     """Render template for SPA - return only content block for AJAX requests"""
     if is_ajax_request():
@@ -39,32 +263,47 @@ def index():
 @app.route('/dashboard')
 def dashboard():
     """Dashboard showing all saved fields"""
-    fields = Field.query.order_by(Field.created_at.desc()).all()
+    # The template counts each field's analyses; load them all in one extra query, metadata only
+    fields = Field.query.options(*strict_load_options(
+        load_only(Field.id, Field.name, Field.created_at, Field.last_analyzed, Field.area_acres, Field.ndvi_cache_date),
+        selectinload(Field.analyses).load_only(FieldAnalysis.id, FieldAnalysis.analysis_date)
+    )).order_by(Field.created_at.desc()).all()
     return render_template('dashboard_content.html', fields=fields)
 
 @app.route('/field/<int:field_id>')
 def field_detail(field_id):
     """Detailed view of a specific field"""
-    field = Field.query.get_or_404(field_id)
-    latest_analysis = FieldAnalysis.query.filter_by(field_id=field_id).order_by(FieldAnalysis.analysis_date.desc()).first()
-    return render_template('field_detail.html', field=field, analysis=latest_analysis)
+    # The template needs every analysis anyway, so pick the latest from the loaded list
+    field = Field.query.options(*strict_load_options(selectinload(Field.analyses))).get_or_404(field_id)
+    latest_analysis = max(field.analyses, key=lambda a: a.analysis_date or datetime.min, default=None)
+    etag = field_page_etag(field, latest_analysis, len(field.analyses))
+    return render_conditional_template(etag, 'field_detail.html', field=field, analysis=latest_analysis)
 
 @app.route('/sites')
 def sites():
     """Sites management dashboard (alias for dashboard)"""
-    fields = Field.query.order_by(Field.created_at.desc()).all()
+    # The zone cards read the latest analysis' NDVI values; the other JSON columns stay unloaded
+    fields = Field.query.options(*strict_load_options(
+        load_only(Field.id, Field.name, Field.created_at, Field.last_analyzed, Field.area_acres),
+        selectinload(Field.analyses).load_only(FieldAnalysis.id, FieldAnalysis.analysis_date, FieldAnalysis.ndvi_data)
+    )).order_by(Field.created_at.desc()).all()
     return render_template('dashboard.html', fields=fields)
 
 @app.route('/reports')
 def reports():
     """Reports dashboard showing all field reports"""
     try:
-        # Eagerly load analyses relationships
-        from sqlalchemy.orm import joinedload
-        fields = Field.query.options(joinedload(Field.analyses)).order_by(Field.created_at.desc()).all()
+        # Load every field's analyses in one extra IN query rather than a fields x analyses join;
+        # the list only counts them, so neither side hydrates the polygon or analysis JSON
+        fields = Field.query.options(*strict_load_options(
+            load_only(Field.id, Field.name, Field.center_lat, Field.center_lng, Field.created_at, Field.area_acres),
+            selectinload(Field.analyses).load_only(FieldAnalysis.id, FieldAnalysis.analysis_date)
+        )).order_by(Field.created_at.desc()).all()
         logger.info(f"Found {len(fields)} fields for reports page")
-        for field in fields:
-            logger.info(f"Field: {field.name}, ID: {field.id}, Analyses: {len(field.analyses)}")
+        # Per-field detail is debug output; the analyses are already loaded for the template
+        if logger.isEnabledFor(logging.DEBUG):
+            for field in fields:
+                logger.debug(f"Field: {field.name}, ID: {field.id}, Analyses: {len(field.analyses)}")
         return render_template('reports.html', fields=fields)
     except Exception as e:
         logger.error(f"Error loading reports: {e}")
@@ -73,42 +312,41 @@ def reports():
 @app.route('/site/<int:field_id>')
 def site_project(field_id):
     """Individual site project page with comprehensive data and controls"""
-    from sqlalchemy.orm import joinedload
-    field = Field.query.options(joinedload(Field.analyses)).get_or_404(field_id)
-    
-    # Sort analyses by date descending (newest first) in Python since template filter isn't working
-    field.analyses = sorted(field.analyses, key=lambda x: x.analysis_date, reverse=True)
+    field = Field.query.options(*strict_load_options(selectinload(Field.analyses))).get_or_404(field_id)
     
-    latest_analysis = field.analyses[0] if field.analyses else None
+    # Analyses come back oldest first from the relationship's order_by
+    latest_analysis = field.analyses[-1] if field.analyses else None
     
-    if is_ajax_request():
-        return render_template('site_project.html', field=field, latest_analysis=latest_analysis)
-    return render_template('site_project.html', field=field, latest_analysis=latest_analysis)
+    etag = field_page_etag(field, latest_analysis, len(field.analyses))
+    return render_conditional_template(etag, 'site_project.html', field=field, latest_analysis=latest_analysis)
 
 @app.route('/field/<int:field_id>/report')
 def field_report(field_id):
     """Comprehensive field report page"""
-    field = Field.query.get_or_404(field_id)
-    latest_analysis = FieldAnalysis.query.filter_by(field_id=field_id).order_by(FieldAnalysis.analysis_date.desc()).first()
-    return render_template('field_report.html', field=field, analysis=latest_analysis)
+    field, latest_analysis = get_field_with_latest_analysis(field_id)
+    return render_conditional_template(field_page_etag(field, latest_analysis), 'field_report.html',
+                                       field=field, analysis=latest_analysis)
 
 @app.route('/api/save_field', methods=['POST'])
 def save_field():
     """Save a new field with polygon data"""
+    data = None
     try:
-        data = request.get_json()
+        # Malformed JSON bodies come back as None and are rejected below rather than raising
+        data = request.get_json(silent=True)
         
-        if not data or 'name' not in data or 'polygon' not in data:
+        if not isinstance(data, dict) or 'name' not in data or 'polygon' not in data:
             return jsonify({'error': 'Missing required data'}), 400
         
-        # Parse polygon data if it's a string
-        polygon_data = data['polygon']
-        if isinstance(polygon_data, str):
-            coordinates = json.loads(polygon_data)
-        else:
-            coordinates = polygon_data
-        
-        if not coordinates or len(coordinates) < 3:
+        # One array conversion both validates the shape (at least 3 [lat, lng] pairs)
+        # and backs the centroid reduction below; a string polygon is parsed first
+        try:
+            polygon_data = data['polygon']
+            coordinates = json.loads(polygon_data) if isinstance(polygon_data, str) else polygon_data
+            coordinate_array = np.asarray(coordinates, dtype=np.float64)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid polygon data'}), 400
+        if coordinate_array.ndim != 2 or coordinate_array.shape[0] < 3 or coordinate_array.shape[1] != 2:
             return jsonify({'error': 'Invalid polygon data'}), 400
         
         # Use provided center coordinates or calculate them
@@ -117,109 +355,112 @@ def save_field():
             center_lng = float(data['center_lng'])
         else:
             # Calculate center point - coordinates are [lat, lng]
-            center_lat = sum(float(coord[0]) for coord in coordinates) / len(coordinates)
-            center_lng = sum(float(coord[1]) for coord in coordinates) / len(coordinates)
+            center_lat, center_lng = coordinate_array.mean(axis=0).tolist()
         
         # Create new field
         field = Field()
         field.name = data['name']
-        field.polygon_data = json.dumps(coordinates)
+        field.set_polygon_coordinates(coordinates)
         field.center_lat = center_lat
         field.center_lng = center_lng
-        field.created_at = datetime.utcnow()
         
+        # Initial NDVI analysis for the new field is required; check Sentinel Hub
+        # credentials before anything is written, on the shared handler that also caches the token
+        if not auth_handler.is_authenticated():
+            return jsonify({'success': False, 'message': 'Sentinel Hub authentication required. Please configure API credentials.'}), 500
+        
+        # Save field first for faster response; the single commit assigns field.id
         db.session.add(field)
         db.session.commit()
         
-        # Generate initial NDVI analysis for the new field (REQUIRED)
-        from ndvi_fetcher import NDVIFetcher
-        from auth import SentinelHubAuth
-        from utils.ndvi_analyzer import analyze_field_ndvi
-        from utils.ai_recommendations import generate_recommendations, get_zone_ndvi_values
-        
-        # Initialize NDVI fetcher
-        auth_handler = SentinelHubAuth()
-        if not auth_handler.is_authenticated():
-            db.session.rollback()
-            return jsonify({'success': False, 'message': 'Sentinel Hub authentication required. Please configure API credentials.'}), 500
+        # Fetch, cache and analyze NDVI and RGB imagery on a background worker so the save
+        # returns as soon as the field row is committed; the pages pick up the cached imagery
+        analysis_executor.submit(run_initial_field_analysis_task, field.id)
         
-        ndvi_fetcher = NDVIFetcher(auth_handler)
+        logging.info(f"Field '{field.name}' saved successfully with ID {field.id}")
+        return jsonify({
+            'success': True,
+            'field_id': field.id
+        })
         
-        # Calculate bounding box from coordinates
-        lats = [coord[0] for coord in coordinates]
-        lngs = [coord[1] for coord in coordinates]
-        bbox = [min(lngs), min(lats), max(lngs), max(lats)]
+    except Exception as e:
+        logging.error(f"Error saving field: {str(e)}")
+        # Summarize the payload; dense polygons make the full dict expensive to stringify
+        payload = data if isinstance(data, dict) else {}
+        polygon = payload.get('polygon')
+        logging.error(f"Request data keys: {list(payload)}, polygon length: {len(polygon) if isinstance(polygon, (list, str)) else 0}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to save field: {str(e)}'}), 500
+
+def run_initial_field_analysis_task(field_id):
+    """Run run_initial_field_analysis on a background worker thread"""
+    with app.app_context():
+        return run_initial_field_analysis(field_id)
+
+def run_initial_field_analysis(field_id):
+    """
+    Fetch and cache NDVI and RGB imagery for a newly saved field and store a basic analysis
+    
+    Returns:
+        Tuple of (response body dict, HTTP status code)
+    """
+    try:
+        field = Field.query.get_or_404(field_id)
         
-        # Create GeoJSON geometry for masking
-        geometry = {
-            "type": "Polygon",
-            "coordinates": [[[coord[1], coord[0]] for coord in coordinates + [coordinates[0]]]]
-        }
+        # Bounding box and GeoJSON masking geometry from the polygon
+        bbox, geometry = field.get_bounds_and_geometry()
         
-        # Save field first for faster response
-        db.session.add(field)
-        db.session.commit()
+        # Fetch both NDVI and RGB satellite images concurrently
+        images = ndvi_fetcher.fetch_vegetation_index_images(bbox, ['ndvi', 'true_color'], geometry=geometry)
+        ndvi_image_bytes = images['ndvi']
+        rgb_image_bytes = images['true_color']
         
-        logging.info(f"Field '{field.name}' saved successfully with ID {field.id}")
+        if ndvi_image_bytes:
+            # Cache NDVI image
+            field.cache_ndvi_image(ndvi_image_bytes)
         
-        # Schedule both NDVI and RGB processing in background (faster user experience)
-        try:
-            # Fetch both NDVI and RGB satellite images
-            ndvi_image_bytes = ndvi_fetcher.fetch_vegetation_index_image(bbox, 'ndvi', geometry=geometry)
-            rgb_image_bytes = ndvi_fetcher.fetch_vegetation_index_image(bbox, 'true_color', geometry=geometry)
+        if rgb_image_bytes:
+            # Cache RGB satellite image
+            field.cache_rgb_image(rgb_image_bytes)
+            logging.info(f"RGB satellite image cached for field {field.id}")
             
+            # Quick analysis for basic validation (only if NDVI data available)
             if ndvi_image_bytes:
-                # Cache NDVI image
-                field.cache_ndvi_image(ndvi_image_bytes)
-                field.last_analyzed = datetime.utcnow()
-                
-            if rgb_image_bytes:
-                # Cache RGB satellite image
-                field.cache_rgb_image(rgb_image_bytes)
-                logging.info(f"RGB satellite image cached for field {field.id}")
-                
-                # Quick analysis for basic validation (only if NDVI data available)
-                if ndvi_image_bytes:
-                    analysis_results = analyze_field_ndvi(ndvi_image_bytes, geometry)
-                    zone_stats = analysis_results.get('zone_statistics', {})
-                else:
-                    analysis_results = {}
-                    zone_stats = {}
-                
-                if zone_stats:
-                    # Generate basic recommendations
-                    zone_ndvi_values = get_zone_ndvi_values(analysis_results)
-                    recommendations = generate_recommendations(zone_ndvi_values, analysis_results.get('zones', {}))
-                    
-                    # Create analysis record
-                    analysis = FieldAnalysis()
-                    analysis.field_id = field.id
-                    analysis.set_ndvi_data(zone_ndvi_values)
-                    analysis.set_health_scores(zone_stats)
-                    analysis.set_recommendations(recommendations)
-                    analysis.analysis_date = datetime.utcnow()
-                    
-                    db.session.add(analysis)
-                
-                db.session.commit()
-                logging.info(f"Generated initial NDVI analysis for field '{field.name}'")
+                analysis_results = analyze_field_ndvi(ndvi_image_bytes, geometry)
+                zone_stats = analysis_results.get('zone_statistics', {})
             else:
-                logging.warning(f"NDVI generation failed for field {field.id}, but field was saved")
+                analysis_results = {}
+                zone_stats = {}
+            
+            if zone_stats:
+                # Generate basic recommendations
+                zone_ndvi_values = get_zone_ndvi_values(analysis_results)
+                recommendations = generate_recommendations(zone_ndvi_values, analysis_results.get('zones', {}))
                 
-        except Exception as e:
-            logging.warning(f"NDVI processing failed for field {field.id}: {e}, but field was saved")
+                # Create analysis record
+                analysis = FieldAnalysis()
+                analysis.field_id = field.id
+                analysis.set_ndvi_data(zone_ndvi_values)
+                analysis.set_health_scores(zone_stats)
+                analysis.set_recommendations(recommendations)
+                
+                db.session.add(analysis)
+            
+            logging.info(f"Generated initial NDVI analysis for field '{field.name}'")
+        else:
+            logging.warning(f"NDVI generation failed for field {field.id}, but field was saved")
         
-        logging.info(f"Field '{field.name}' saved successfully with ID {field.id}")
-        return jsonify({'success': True, 'field_id': field.id})
+        db.session.commit()
+        return {
+            'field_id': field.id,
+            'ndvi_cached': bool(ndvi_image_bytes),
+            'rgb_cached': bool(rgb_image_bytes)
+        }, 200
         
     except Exception as e:
-        logging.error(f"Error saving field: {str(e)}")
-        try:
-            logging.error(f"Request data: {data}")
-        except:
-            logging.error("Request data not available")
+        logging.warning(f"NDVI processing failed for field {field_id}: {e}, but field was saved")
         db.session.rollback()
-        return jsonify({'success': False, 'message': f'Failed to save field: {str(e)}'}), 500
+        return {'field_id': field_id, 'error': f'Initial imagery processing failed: {str(e)}'}, 500
 
 @app.route('/field/<int:field_id>/analyze', methods=['POST'])
 def analyze_field_vegetation_index(field_id):
@@ -229,21 +470,8 @@ def analyze_field_vegetation_index(field_id):
         data = request.get_json()
         index_type = data.get('index_type', 'ndvi')
         
-        # Get polygon coordinates
-        coordinates = field.get_polygon_coordinates()
-        
-        # Calculate bounding box from coordinates
-        lats = [coord[0] for coord in coordinates]
-        lngs = [coord[1] for coord in coordinates]
-        bbox = [min(lngs), min(lats), max(lngs), max(lats)]
-        
-        # Create GeoJSON geometry for polygon masking
-        geometry = {
-            "type": "Polygon",
-            "coordinates": [[
-                [coord[1], coord[0]] for coord in coordinates
-            ] + [[coordinates[0][1], coordinates[0][0]]]]
-        }
+        # Bounding box and GeoJSON geometry for polygon masking
+        bbox, geometry = field.get_bounds_and_geometry()
         
         logging.info(f"Generating {index_type.upper()} analysis for field {field_id}")
         
@@ -258,6 +486,22 @@ def analyze_field_vegetation_index(field_id):
         logging.error(f"Error analyzing field {field_id}: {str(e)}")
         return jsonify({'error': f'Failed to analyze field: {str(e)}'}), 500
 
+def ai_analysis_fingerprint(field, analysis_results):
+    """
+    Fingerprint the inputs of a comprehensive AI analysis
+    
+    Covers the field's polygon and the day (as in get_analysis_etag), the cached NDVI and RGB
+    images the visual analysis reads, and the posted per-index results.
+    
+    Returns:
+        32-character hex digest
+    """
+    inputs = (
+        f"{field.get_analysis_etag()}|{field.ndvi_cache_date}|{field.rgb_cache_date}|"
+        f"{json.dumps(analysis_results, sort_keys=True, default=str)}"
+    )
+    return hashlib.blake2b(inputs.encode('utf-8'), digest_size=16).hexdigest()
+
 @app.route('/field/<int:field_id>/ai-analysis', methods=['POST'])
 def comprehensive_ai_analysis(field_id):
     """Generate comprehensive AI analysis for all vegetation indices"""
@@ -266,33 +510,31 @@ def comprehensive_ai_analysis(field_id):
         data = request.get_json()
         analysis_results = data.get('analysis_results', {})
         
+        # The same imagery, index results and day's conditions produce the same insights;
+        # reuse the stored result instead of calling OpenAI again
+        fingerprint = ai_analysis_fingerprint(field, analysis_results)
+        stored_insights = db.session.query(FieldAnalysis.ai_analysis_data).filter_by(
+            field_id=field.id, analysis_fingerprint=fingerprint
+        ).order_by(FieldAnalysis.analysis_date.desc()).limit(1).scalar()
+        if stored_insights:
+            logging.info(f"Reusing stored AI analysis for field {field_id} with unchanged inputs")
+            return jsonify(load_json_text(stored_insights))
+        
         # Count successful analyses
         successful_indices = [idx for idx, result in analysis_results.items() if result.get('success')]
         total_indices = len(analysis_results)
         
         # Get field information
         field_area = field.calculate_area_acres()
-        coordinates = field.get_polygon_coordinates()
         
-        # Get weather data for the field location
-        weather_data = None
-        try:
-            import requests
-            import os
-            weather_api_key = os.environ.get('OPENWEATHERMAP_API_KEY')
-            if weather_api_key:
-                weather_url = f"http://api.openweathermap.org/data/2.5/weather?lat={field.center_lat}&lon={field.center_lng}&appid={weather_api_key}&units=imperial"
-                weather_response = requests.get(weather_url, timeout=10)
-                if weather_response.status_code == 200:
-                    weather_data = weather_response.json()
-        except Exception as e:
-            logging.warning(f"Failed to fetch weather data: {e}")
+        # Get weather data for the field location; it is independent of the imagery, so it
+        # downloads while the visual analysis below waits on OpenAI
+        weather_future = lookup_executor.submit(fetch_current_weather_report, field.center_lat, field.center_lng)
         
         # Perform visual field analysis using both RGB and NDVI satellite imagery (optional)
         visual_analysis = None
         try:
             if field.has_cached_ndvi():
-                from utils.visual_field_analyzer import VisualFieldAnalyzer
                 visual_analyzer = VisualFieldAnalyzer()
                 
                 field_info = {
@@ -315,6 +557,8 @@ def comprehensive_ai_analysis(field_id):
         except Exception as e:
             logging.warning(f"Visual field analysis failed for field {field_id}, continuing without visual data: {e}")
             visual_analysis = None
+        
+        weather_data = weather_future.result()
 
         # Prepare data for AI analysis
         analysis_context = {
@@ -338,6 +582,8 @@ def comprehensive_ai_analysis(field_id):
         try:
             ai_insights = generate_field_ai_insights(analysis_context)
         except Exception as e:
+            # Fallback text is not stored under the fingerprint, so a retry generates again
+            fingerprint = None
             logging.error(f"AI insights generation failed for field {field_id}: {e}")
             # Provide fallback response for failed AI analysis
             ai_insights = {
@@ -349,13 +595,17 @@ def comprehensive_ai_analysis(field_id):
                 'spatial_insights': 'Visual field analysis data collected - retry for detailed spatial recommendations'
             }
         
-        # Store analysis in database
+        # Store analysis in database: two Core statements in one transaction, since neither
+        # the new row nor the field instance is needed afterwards
         try:
-            new_analysis = FieldAnalysis()
-            new_analysis.field_id = field.id
-            new_analysis.ai_analysis_data = json.dumps(ai_insights)
-            db.session.add(new_analysis)
-            field.last_analyzed = datetime.utcnow()
+            analyzed_at = datetime.utcnow()
+            db.session.execute(insert(FieldAnalysis).values(
+                field_id=field.id,
+                analysis_date=analyzed_at,
+                ai_analysis_data=json.dumps(ai_insights),
+                analysis_fingerprint=fingerprint
+            ))
+            db.session.execute(update(Field).where(Field.id == field.id).values(last_analyzed=analyzed_at))
             db.session.commit()
             
             logging.info(f"Comprehensive AI analysis completed for field {field_id}")
@@ -375,6 +625,17 @@ def comprehensive_ai_analysis(field_id):
             'weather_recommendations': ['Monitor field conditions manually']
         }), 500
 
+def fetch_current_weather_report(lat, lng):
+    """
+    Fetch current OpenWeatherMap conditions in imperial units, as consumed by generate_field_ai_insights
+    
+    Repeat calls for the same location within WEATHER_CACHE_TTL_SECONDS reuse the previous response.
+    
+    Returns:
+        Raw API response dictionary, or None if unavailable
+    """
+    return WeatherService().get_current_weather_report(lat, lng)
+
 def generate_field_ai_insights(analysis_context):
     """Generate AI insights using OpenAI based on field analysis data"""
     # For now, provide comprehensive analysis directly to ensure reliability
@@ -501,6 +762,16 @@ def get_fallback_response(field_name):
     }
     return fallbacks.get(field_name, 'Analysis data unavailable')
 
+def get_monitoring_settings(field_id):
+    """
+    Get a field's monitoring settings by primary key
+    
+    Returns:
+        Settings dictionary, or None if the field has none
+    """
+    settings_row = db.session.get(MonitoringSettings, field_id)
+    return settings_row.get_settings() if settings_row is not None else None
+
 @app.route('/field/<int:field_id>/monitoring', methods=['POST'])
 def save_monitoring_settings(field_id):
     """Save automated monitoring settings for a field"""
@@ -521,15 +792,10 @@ def save_monitoring_settings(field_id):
             'created_at': datetime.utcnow().isoformat()
         }
         
-        # You could extend the Field model to include monitoring_settings column
-        # For now, we'll use the analysis table to store settings
-        settings_analysis = FieldAnalysis()
-        settings_analysis.field_id = field.id
-        settings_analysis.ai_analysis_data = json.dumps({
-            'type': 'monitoring_settings',
-            'settings': monitoring_settings
-        })
-        db.session.add(settings_analysis)
+        # One settings row per field, replaced on every save
+        settings_row = MonitoringSettings(field_id=field.id)
+        settings_row.set_settings(monitoring_settings)
+        db.session.merge(settings_row)
         db.session.commit()
         
         logging.info(f"Monitoring settings saved for field {field_id}: {monitoring_settings['frequency']}")
@@ -550,16 +816,10 @@ def test_field_monitoring(field_id):
     try:
         field = Field.query.get_or_404(field_id)
         
-        # Get monitoring settings
-        settings_query = FieldAnalysis.query.filter_by(field_id=field_id)\
-            .filter(FieldAnalysis.ai_analysis_data.like('%monitoring_settings%'))\
-            .order_by(FieldAnalysis.analysis_date.desc()).first()
-        
-        if not settings_query:
+        monitoring_settings = get_monitoring_settings(field_id)
+        if monitoring_settings is None:
             return jsonify({'error': 'No monitoring settings configured for this field'}), 400
         
-        settings_data = json.loads(settings_query.ai_analysis_data or '{}')
-        monitoring_settings = settings_data.get('settings', {})
         notification_email = monitoring_settings.get('notification_email')
         
         if not notification_email:
@@ -598,62 +858,122 @@ def test_field_monitoring(field_id):
 
 @app.route('/api/analyze_field/<int:field_id>', methods=['POST'])
 def analyze_field(field_id):
-    """Analyze a field using NDVI data and AI recommendations"""
+    """
+    Analyze a field using NDVI data and AI recommendations
+    
+    With ?async=1 the analysis runs on a background worker instead of holding this
+    request; the response is 202 with a task_id to poll at /api/analysis_status/<task_id>.
+    """
+    if request.args.get('async') == '1':
+        task_id = uuid.uuid4().hex
+        future = analysis_executor.submit(run_field_analysis_task, field_id)
+        analysis_tasks.set(task_id, future, ANALYSIS_TASK_TTL_SECONDS)
+        
+        def shorten_expiry(done):
+            # Once finished, the result only waits a short grace period for its poll;
+            # skip it if the task was already collected or evicted
+            if analysis_tasks.get(task_id) is done:
+                analysis_tasks.set(task_id, done, ANALYSIS_RESULT_GRACE_SECONDS)
+        
+        future.add_done_callback(shorten_expiry)
+        return jsonify({
+            'task_id': task_id,
+            'status_url': url_for('analysis_status', task_id=task_id)
+        }), 202
+    
+    # Inputs unchanged since the latest analysis (same polygon, same day's imagery):
+    # the client's copy is still current, so skip the whole NDVI/weather/AI chain
+    if request.if_none_match:
+        field = Field.query.get_or_404(field_id)
+        etag = field.get_analysis_etag()
+        latest_etag = db.session.query(FieldAnalysis.etag).filter_by(field_id=field_id).order_by(
+            FieldAnalysis.analysis_date.desc()
+        ).limit(1).scalar()
+        if latest_etag == etag and request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+    
+    result, status = run_field_analysis(field_id)
+    response = jsonify(result)
+    response.status_code = status
+    if status == 200:
+        response.set_etag(Field.query.get(field_id).get_analysis_etag())
+    return response
+
+@app.route('/api/analysis_status/<task_id>')
+def analysis_status(task_id):
+    """Report the state of a background field analysis, returning its result once finished"""
+    future = analysis_tasks.get(task_id)
+    if future is None:
+        return jsonify({'error': 'Unknown, expired or already collected task'}), 404
+    
+    if not future.done():
+        return jsonify({'task_id': task_id, 'state': 'PENDING'}), 202
+    
+    analysis_tasks.pop(task_id)
+    result, status = future.result()
+    return jsonify({
+        'task_id': task_id,
+        'state': 'SUCCESS' if status == 200 else 'FAILURE',
+        'result': result
+    }), status
+
+def run_field_analysis_task(field_id):
+    """Run run_field_analysis on a background worker thread"""
+    with app.app_context():
+        return run_field_analysis(field_id)
+
+def run_field_analysis(field_id):
+    """
+    Fetch NDVI imagery, analyze it with weather and AI insights, and store the analysis
+    
+    Returns:
+        Tuple of (response body dict, HTTP status code)
+    """
     try:
         field = Field.query.get_or_404(field_id)
         
         # Get polygon coordinates
         coordinates = field.get_polygon_coordinates()
         
+        # Weather depends only on the field center, so look it up while the imagery downloads
+        ai_analyzer = AIFieldAnalyzer()
+        weather_future = ai_analyzer.start_weather_analysis({'center_lat': field.center_lat, 'center_lng': field.center_lng})
+        
         # Fetch NDVI satellite imagery using NDVIFetcher
         logging.info(f"Fetching NDVI data for field {field_id}")
         
-        # Calculate bounding box from coordinates
-        lats = [coord[0] for coord in coordinates]
-        lngs = [coord[1] for coord in coordinates]
-        bbox = [min(lngs), min(lats), max(lngs), max(lats)]
-        
-        # Create GeoJSON geometry for polygon masking
-        geometry = {
-            "type": "Polygon",
-            "coordinates": [[
-                [coord[1], coord[0]] for coord in coordinates
-            ] + [[coordinates[0][1], coordinates[0][0]]]]
-        }
+        # Bounding box and GeoJSON geometry for polygon masking
+        bbox, geometry = field.get_bounds_and_geometry(coordinates)
         
         ndvi_image_data = ndvi_fetcher.fetch_vegetation_index_image(bbox, 'ndvi', geometry=geometry)
         
         if not ndvi_image_data:
-            return jsonify({'error': 'Failed to fetch satellite imagery'}), 500
+            return {'error': 'Failed to fetch satellite imagery'}, 500
         
         # Cache NDVI image for field
         field.cache_ndvi_image(ndvi_image_data)
         
         # Analyze NDVI image using proper image processing
-        from utils.ndvi_analyzer import NDVIAnalyzer
         ndvi_analyzer = NDVIAnalyzer()
         
-        # Convert polygon coordinates to proper geometry format for masking
-        field_geometry = {
-            "type": "Polygon",
-            "coordinates": [[
-                [coord[1], coord[0]] for coord in coordinates
-            ] + [[coordinates[0][1], coordinates[0][0]]]]
-        }
-        
-        # Perform comprehensive NDVI analysis
-        ndvi_analysis_results = ndvi_analyzer.analyze_ndvi_image(ndvi_image_data, field_geometry)
+        # Perform comprehensive NDVI analysis, masking with the geometry built above
+        ndvi_analysis_results = ndvi_analyzer.analyze_ndvi_image(ndvi_image_data, geometry)
         
         # Extract zone statistics and create proper zone data
         zone_statistics = ndvi_analysis_results.get('zone_statistics', {})
+        zone_grid = field.get_zones()
         zones = {}
         ndvi_data = {}
         
-        # Build zones and NDVI data from actual analysis
+        # Build zones and NDVI data from actual analysis; each grid zone reports its own
+        # [min_lng, min_lat, max_lng, max_lat] from the stored grid, others the field bbox
         for zone_id, stats in zone_statistics.items():
+            zone_coords = zone_grid.get(zone_id)
             zones[zone_id] = {
                 'stats': stats,
-                'bounds': bbox,
+                'bounds': [zone_coords[0][1], zone_coords[0][0], zone_coords[2][1], zone_coords[2][0]] if zone_coords else bbox,
                 'health': stats.get('health_classification', 'unknown')
             }
             ndvi_data[zone_id] = stats.get('mean_ndvi', 0.0)
@@ -669,10 +989,6 @@ def analyze_field(field_id):
             }
             ndvi_data['field_center'] = field_mean_ndvi
         
-        # Initialize services for comprehensive analysis
-        weather_service = WeatherService()
-        ai_analyzer = AIFieldAnalyzer()
-        
         # Prepare field data
         field_data = {
             'name': field.name,
@@ -684,7 +1000,7 @@ def analyze_field(field_id):
         }
         
         # Generate comprehensive AI analysis
-        comprehensive_analysis = ai_analyzer.generate_comprehensive_analysis(field_data, ndvi_image_data)
+        comprehensive_analysis = ai_analyzer.generate_comprehensive_analysis(field_data, ndvi_image_data, weather_future)
         
         # Extract weather data from comprehensive analysis
         weather_analysis = comprehensive_analysis.get('weather_analysis', {})
@@ -704,15 +1020,12 @@ def analyze_field(field_id):
         # Use AI recommendations or fallback to basic recommendations
         recommendations = ai_insights.get('recommendations', generate_recommendations(ndvi_data, zones))
         
-        # Calculate health scores based on NDVI values
-        health_scores = {}
-        for zone_id, ndvi_value in ndvi_data.items():
-            if ndvi_value > 0.6:
-                health_scores[zone_id] = 'healthy'
-            elif ndvi_value > 0.3:
-                health_scores[zone_id] = 'moderate'
-            else:
-                health_scores[zone_id] = 'stressed'
+        # Calculate health scores based on NDVI values: > 0.6 healthy, > 0.3 moderate,
+        # otherwise (including NaN) stressed, classified in one vectorized pass
+        ndvi_values = np.fromiter(ndvi_data.values(), dtype=np.float64, count=len(ndvi_data))
+        health_levels = np.digitize(ndvi_values, HEALTH_SCORE_THRESHOLDS, right=True)
+        health_levels[np.isnan(ndvi_values)] = 0
+        health_scores = dict(zip(ndvi_data.keys(), HEALTH_SCORE_LABELS[health_levels].tolist()))
         
         # Save analysis to database
         analysis = FieldAnalysis()
@@ -721,6 +1034,7 @@ def analyze_field(field_id):
         analysis.set_health_scores(health_scores)
         analysis.set_recommendations(recommendations)
         analysis.set_weather_data(weather_data)
+        analysis.etag = field.get_analysis_etag()
         
         # Store comprehensive analysis using the model method
         try:
@@ -735,7 +1049,7 @@ def analyze_field(field_id):
         
         logging.info(f"Field {field_id} analyzed successfully with AI insights")
         
-        return jsonify({
+        return {
             'success': True,
             'ndvi_data': ndvi_data,
             'health_scores': health_scores,
@@ -744,23 +1058,71 @@ def analyze_field(field_id):
             'zones': zones,
             'comprehensive_analysis': comprehensive_analysis,
             'ai_insights': ai_insights
-        })
+        }, 200
         
     except Exception as e:
         logging.error(f"Error analyzing field {field_id}: {str(e)}")
-        return jsonify({'error': 'Failed to analyze field'}), 500
+        return {'error': 'Failed to analyze field'}, 500
 
 @app.route('/field/<int:field_id>/history')
 def field_analytics_history(field_id):
-    """Get enhanced analysis history for a field with analytics data"""
+    """
+    Get enhanced analysis history for a field with analytics data
+    
+    Results are newest first, HISTORY_PAGE_SIZE at a time. next_cursor in the response, passed
+    back as ?before=, fetches the following (older) page. The cursor is "<analysis_date>_<id>",
+    so analyses sharing a timestamp are neither skipped nor repeated across pages.
+    """
     try:
-        field = Field.query.get_or_404(field_id)
-        analyses = FieldAnalysis.query.filter_by(field_id=field_id).order_by(FieldAnalysis.analysis_date.desc()).limit(50).all()
+        field = Field.query.options(*strict_load_options()).get_or_404(field_id)
+        
+        before = request.args.get('before')
+        try:
+            if before:
+                before_date_text, _, before_id_text = before.rpartition('_')
+                before_key = (datetime.fromisoformat(before_date_text), int(before_id_text))
+            else:
+                before_key = None
+        except ValueError:
+            return jsonify({'error': 'Invalid before cursor'}), 400
+        
+        # The history only changes when an analysis is added or removed, or the field is
+        # edited; answer 304 from that summary before loading and reshaping any rows
+        analysis_count, latest_date = db.session.query(
+            func.count(FieldAnalysis.id), func.max(FieldAnalysis.analysis_date)
+        ).filter(FieldAnalysis.field_id == field_id).one()
+        etag = hashlib.blake2b(
+            f"{field.name}|{field.polygon_data}|{analysis_count}|{latest_date}|{before}".encode('utf-8'),
+            digest_size=8
+        ).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
+        # Keyset pagination on (analysis_date, id): each page is a range scan of the
+        # (field_id, analysis_date) index, with id breaking ties between equal timestamps.
+        # Only the needed columns are selected, as plain rows rather than ORM objects
+        analyses_query = db.session.query(
+            FieldAnalysis.id,
+            FieldAnalysis.analysis_date,
+            FieldAnalysis.ndvi_data,
+            FieldAnalysis.health_scores,
+            FieldAnalysis.recommendations,
+            FieldAnalysis.weather_data,
+            FieldAnalysis.ai_analysis_data
+        ).filter(FieldAnalysis.field_id == field_id)
+        if before_key is not None:
+            analyses_query = analyses_query.filter(tuple_(FieldAnalysis.analysis_date, FieldAnalysis.id) < before_key)
+        analyses = analyses_query.order_by(
+            FieldAnalysis.analysis_date.desc(), FieldAnalysis.id.desc()
+        ).limit(HISTORY_PAGE_SIZE).all()
         
         history_data = []
         for analysis in analyses:
-            ai_data = analysis.get_ai_analysis_data() or {}
-            weather_data = analysis.get_weather_data() or {}
+            # Each JSON column is parsed exactly once
+            ai_data = load_json_column(analysis.ai_analysis_data, {})
+            weather_data = load_json_column(analysis.weather_data, {})
             
             # Extract numeric values for analytics from stored data
             ndvi_avg = None
@@ -774,7 +1136,7 @@ def field_analytics_history(field_id):
                 health_score = health_mapping.get(ai_data['overall_health'], 0.6)
             
             # Get NDVI data from stored analysis
-            ndvi_data = analysis.get_ndvi_data()
+            ndvi_data = load_json_column(analysis.ndvi_data, {})
             if ndvi_data and isinstance(ndvi_data, dict):
                 # Calculate average from zone data if available
                 zone_values = [v for k, v in ndvi_data.items() if isinstance(v, (int, float))]
@@ -793,9 +1155,9 @@ def field_analytics_history(field_id):
             history_data.append({
                 'id': analysis.id,
                 'analysis_date': analysis.analysis_date.isoformat(),
-                'ndvi_data': analysis.get_ndvi_data(),
-                'health_scores': analysis.get_health_scores(),
-                'recommendations': analysis.get_recommendations(),
+                'ndvi_data': ndvi_data,
+                'health_scores': load_json_column(analysis.health_scores, {}),
+                'recommendations': load_json_column(analysis.recommendations, []),
                 'weather_data': weather_data,
                 'ai_analysis': ai_data,
                 'ndvi_avg': round(ndvi_avg, 3) if ndvi_avg else None,
@@ -807,7 +1169,7 @@ def field_analytics_history(field_id):
                 'weather_summary': weather_data.get('weather', [{}])[0].get('description', '') if weather_data.get('weather') else ''
             })
         
-        return jsonify({
+        response = jsonify({
             'field_name': field.name,
             'field_area': field.calculate_area_acres(),
             'analyses': history_data,
@@ -815,8 +1177,13 @@ def field_analytics_history(field_id):
             'date_range': {
                 'earliest': analyses[-1].analysis_date.isoformat() if analyses else None,
                 'latest': analyses[0].analysis_date.isoformat() if analyses else None
-            }
+            },
+            'next_cursor': (f"{analyses[-1].analysis_date.isoformat()}_{analyses[-1].id}"
+                            if len(analyses) == HISTORY_PAGE_SIZE else None)
         })
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         logging.error(f"Error retrieving field history: {e}")
@@ -831,6 +1198,7 @@ def delete_field(field_id):
         
         db.session.delete(field)
         db.session.commit()
+        remove_cached_png_files(f"{field_id}-*")
         
         logging.info(f"Field '{field_name}' deleted successfully")
         return jsonify({'success': True})
@@ -846,12 +1214,8 @@ def delete_field(field_id):
 def field_comprehensive_analysis(field_id):
     """Get comprehensive AI analysis data for a field"""
     try:
-        field = Field.query.get_or_404(field_id)
-        
-        # Get the latest analysis with AI data
-        latest_analysis = FieldAnalysis.query.filter_by(field_id=field_id)\
-                                           .order_by(FieldAnalysis.analysis_date.desc())\
-                                           .first()
+        # Get the field and its latest analysis with AI data
+        field, latest_analysis = get_field_with_latest_analysis(field_id)
         
         if not latest_analysis:
             return jsonify({'error': 'No analysis data available'}), 404
@@ -900,14 +1264,7 @@ def get_cached_ndvi(field_id):
     if not field.has_cached_ndvi():
         return jsonify({"error": "No cached NDVI image available"}), 404
     
-    return Response(
-        field.get_cached_ndvi_image(),
-        mimetype='image/png',
-        headers={
-            'Content-Disposition': f'inline; filename="ndvi_{field.name}.png"',
-            'Cache-Control': 'public, max-age=86400'
-        }
-    )
+    return cached_png_response(field, 'ndvi', f"ndvi_{field.name}.png")
 
 @app.route('/field/<int:field_id>/cached_rgb')
 def get_cached_rgb(field_id):
@@ -917,14 +1274,7 @@ def get_cached_rgb(field_id):
     if not field.has_cached_rgb():
         return jsonify({"error": "No cached RGB image available"}), 404
     
-    return Response(
-        field.get_cached_rgb_image(),
-        mimetype='image/png',
-        headers={
-            'Content-Disposition': f'inline; filename="rgb_{field.name}.png"',
-            'Cache-Control': 'public, max-age=86400'
-        }
-    )
+    return cached_png_response(field, 'rgb', f"rgb_{field.name}.png")
 
 @app.route('/field/<int:field_id>/cached_<index_type>')
 def get_cached_vegetation_index(field_id, index_type):
@@ -934,14 +1284,7 @@ def get_cached_vegetation_index(field_id, index_type):
     if not field.has_cached_vegetation_index(index_type):
         return jsonify({"error": f"No cached {index_type} image available"}), 404
     
-    return Response(
-        field.get_cached_vegetation_index_image(index_type),
-        mimetype='image/png',
-        headers={
-            'Content-Disposition': f'inline; filename="{index_type}_{field.name}.png"',
-            'Cache-Control': 'public, max-age=86400'
-        }
-    )
+    return cached_png_response(field, index_type, f"{index_type}_{field.name}.png")
 
 @app.route('/health')
 def health_check():
@@ -972,16 +1315,18 @@ def get_ndvi_image():
         PNG image response or error message
     """
     try:
-        # Determine bounding box and geometry
+        # Determine bounding box, geometry and saved field from a single read of the body
         if request.method == 'POST':
             data = request.get_json()
             if not data or 'bbox' not in data:
                 return jsonify({"error": "Missing 'bbox' in request JSON"}), 400
             bbox = data['bbox']
             geometry = data.get('geometry')  # Optional polygon geometry
+            field_id = data.get('field_id')  # Optional saved field with a cached NDVI image
         else:
             bbox = [-122.5, 37.7, -122.3, 37.9]  # Default San Francisco Bay Area
             geometry = None
+            field_id = None
         
         # Validate bounding box
         if not ndvi_fetcher.validate_bbox(bbox):
@@ -999,26 +1344,19 @@ def get_ndvi_image():
         
         logger.info("Sentinel Hub authentication successful")
         
-        # Check if this is for a saved field and has cached NDVI
-        field_id = None
-        if request.method == 'POST':
-            data = request.get_json() or {}
-            field_id = data.get('field_id')
-        
         # Try to use cached image if available and fresh
         if field_id:
             try:
-                field = Field.query.get(field_id)
-                if field and field.has_cached_ndvi() and field.is_ndvi_cache_fresh():
+                # One query checks freshness (what Field.is_ndvi_cache_fresh() allows: under 31
+                # days old) and fetches only the image column, without loading the Field row
+                fresh_after = datetime.utcnow() - timedelta(days=31)
+                cached = db.session.query(Field.cached_ndvi_image, Field.ndvi_cache_date).filter(
+                    Field.id == field_id, Field.ndvi_cache_date > fresh_after
+                ).first()
+                if cached and cached.cached_ndvi_image:
                     logger.info(f"Serving cached NDVI for field {field_id}")
-                    return Response(
-                        field.get_cached_ndvi_image(),
-                        mimetype='image/png',
-                        headers={
-                            'Content-Disposition': f'inline; filename="ndvi_field_{field_id}.png"',
-                            'Cache-Control': 'public, max-age=86400'
-                        }
-                    )
+                    etag = Field.format_cache_etag(field_id, 'ndvi', cached.ndvi_cache_date)
+                    return png_response(cached.cached_ndvi_image, 86400, f"ndvi_field_{field_id}.png", etag=etag)
             except Exception as e:
                 logger.warning(f"Could not check cached NDVI: {e}")
         
@@ -1037,14 +1375,7 @@ def get_ndvi_image():
                 except Exception as e:
                     logger.warning(f"Could not cache NDVI: {e}")
             
-            return Response(
-                image_data,
-                mimetype='image/png',
-                headers={
-                    'Content-Disposition': f'inline; filename="ndvi_{bbox[0]}_{bbox[1]}.png"',
-                    'Cache-Control': 'public, max-age=3600'
-                }
-            )
+            return png_response(image_data, 3600, f"ndvi_{bbox[0]}_{bbox[1]}.png")
         else:
             return jsonify({
                 "error": "Failed to fetch NDVI image",
@@ -1098,14 +1429,8 @@ def get_vegetation_index():
                 field = Field.query.get(field_id)
                 if field and field.has_cached_vegetation_index(index_type) and field.is_vegetation_index_cache_fresh(index_type):
                     logging.info(f"Serving cached {index_type} for field {field_id}")
-                    return Response(
-                        field.get_cached_vegetation_index_image(index_type),
-                        mimetype='image/png',
-                        headers={
-                            'Cache-Control': 'public, max-age=86400',
-                            'Content-Type': 'image/png'
-                        }
-                    )
+                    return png_response(field.get_cached_vegetation_index_image(index_type), 86400,
+                                        etag=field.get_cache_etag(index_type))
             except Exception as e:
                 logging.warning(f"Could not check cached {index_type}: {e}")
         
@@ -1124,14 +1449,7 @@ def get_vegetation_index():
                 except Exception as e:
                     logging.warning(f"Could not cache {index_type}: {e}")
             
-            return Response(
-                image_data,
-                mimetype='image/png',
-                headers={
-                    'Cache-Control': 'public, max-age=3600',
-                    'Content-Type': 'image/png'
-                }
-            )
+            return png_response(image_data, 3600)
         else:
             return jsonify({"error": "Failed to fetch satellite imagery"}), 500
             
@@ -0,0 +1,29 @@
+"""
+Checks for the index code -> color lookup tables in ndvi_fetcher
+"""
+import numpy as np
+import pytest
+
+from ndvi_fetcher import (
+    _INDEX_CODE_MASKED,
+    _INDEX_SPECS,
+    _index_color_lut,
+    _index_threshold_codes,
+)
+
+
+def _ramp_rgb(color):
+    return np.round(np.array(color) * 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('index_type', sorted(_INDEX_SPECS))
+def test_code_at_threshold_gets_upper_class_color(index_type):
+    """A value exactly on a threshold is not < threshold, so it takes the next ramp color"""
+    ramp = _INDEX_SPECS[index_type]['ramp']
+    lut = _index_color_lut(index_type)
+    thresholds = np.array([threshold for threshold, _, _ in ramp[:-1]])
+    
+    for position, code in enumerate(_index_threshold_codes(thresholds)):
+        if code - 1 > _INDEX_CODE_MASKED:
+            np.testing.assert_array_equal(lut[code - 1, :3], _ramp_rgb(ramp[position][1]))
+        np.testing.assert_array_equal(lut[code, :3], _ramp_rgb(ramp[position + 1][1]))
@@ -4,29 +4,87 @@ Integrates NDVI, weather, and agricultural data to generate detailed field repor
 """
 import os
 import json
+import hashlib
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 from openai import OpenAI
 from .weather_service import WeatherService
 from .ndvi_analyzer import analyze_field_ndvi
+from .ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Insights are a function of the prompt alone, so identical field summaries reuse the
+# previous completion for a day instead of calling OpenAI again
+AI_INSIGHTS_CACHE_TTL_SECONDS = 24 * 60 * 60
+_insights_cache = TTLCache(maxsize=256)
+
+# Static prompt text lives at module level; each analysis only formats in its data summary
+ANALYSIS_SYSTEM_PROMPT = "You are an expert agricultural consultant with deep knowledge of precision agriculture, satellite imagery analysis, weather patterns, and crop management. Provide detailed, actionable insights based on field data."
+ANALYSIS_PROMPT_TEMPLATE = """
+        As an expert agricultural consultant, analyze the following field data and provide comprehensive insights:
+
+        {data_summary}
+
+        Please provide a detailed analysis in JSON format with the following structure:
+        {{
+            "summary": "Brief overview of field condition and key observations",
+            "key_findings": ["Finding 1", "Finding 2", "Finding 3"],
+            "recommendations": [
+                "Immediate action recommendation 1",
+                "Short-term recommendation 2", 
+                "Long-term strategy recommendation 3"
+            ],
+            "priority_actions": [
+                "Most urgent action needed",
+                "Second priority action"
+            ],
+            "long_term_strategy": "Strategic recommendations for field optimization",
+            "confidence_score": 0.85
+        }}
+
+        Focus on:
+        1. Crop health and vegetation vigor assessment
+        2. Weather impact on crop development
+        3. Risk identification and mitigation
+        4. Actionable management recommendations
+        5. Productivity optimization strategies
+
+        Provide specific, actionable insights that a farmer can implement.
+        """
+
+# Weather lookups are network-bound and independent of the imagery, so they run on
+# these threads while NDVI is fetched and analyzed
+_weather_executor = ThreadPoolExecutor(max_workers=4)
+
+def get_openai_client() -> OpenAI:
+    """Get the process-wide OpenAI client, so its HTTP connection pool is reused across analyses"""
+    return _openai_client_for_key(os.environ.get('OPENAI_API_KEY'))
+
+@lru_cache(maxsize=None)
+def _openai_client_for_key(api_key: Optional[str]) -> OpenAI:
+    return OpenAI(api_key=api_key)
+
 class AIFieldAnalyzer:
     """Advanced AI-powered field analysis system"""
     
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        self.openai_client = get_openai_client()
         self.weather_service = WeatherService()
         
-    def generate_comprehensive_analysis(self, field_data: Dict, ndvi_image_bytes: Optional[bytes] = None) -> Dict:
+    def generate_comprehensive_analysis(self, field_data: Dict, ndvi_image_bytes: Optional[bytes] = None,
+                                        weather_future: Optional[Future] = None) -> Dict:
         """
         Generate comprehensive AI analysis combining all available data sources
         
         Args:
             field_data: Field information including coordinates, area, etc.
             ndvi_image_bytes: NDVI satellite image data
+            weather_future: Weather analysis already started with start_weather_analysis;
+                one is started here otherwise
             
         Returns:
             Complete analysis report with recommendations
@@ -34,8 +92,10 @@ class AIFieldAnalyzer:
         logger.info(f"Starting comprehensive analysis for field: {field_data.get('name', 'Unknown')}")
         
         analysis_results = {}
+        if weather_future is None:
+            weather_future = self.start_weather_analysis(field_data)
         
-        # 1. NDVI Analysis
+        # 1. NDVI Analysis (the weather lookup proceeds meanwhile)
         if ndvi_image_bytes:
             ndvi_analysis = self._analyze_ndvi_data(ndvi_image_bytes, field_data)
             analysis_results['ndvi_analysis'] = ndvi_analysis
@@ -43,20 +103,7 @@ class AIFieldAnalyzer:
             analysis_results['ndvi_analysis'] = None
             
         # 2. Weather Analysis
-        center_lat = field_data.get('center_lat')
-        center_lng = field_data.get('center_lng')
-        
-        if center_lat is not None and center_lng is not None:
-            weather_analysis = self._analyze_weather_conditions(float(center_lat), float(center_lng))
-        else:
-            weather_analysis = {
-                "current_conditions": {},
-                "forecast": [],
-                "growing_conditions": {"rating": "unknown"},
-                "irrigation_needs": {"recommendation": "unknown"},
-                "alerts": []
-            }
-        analysis_results['weather_analysis'] = weather_analysis
+        analysis_results['weather_analysis'] = weather_future.result()
         
         # 3. Field Characteristics Analysis
         field_analysis = self._analyze_field_characteristics(field_data)
@@ -80,6 +127,31 @@ class AIFieldAnalyzer:
         
         return analysis_results
     
+    def start_weather_analysis(self, field_data: Dict) -> Future:
+        """
+        Start the weather analysis for a field's center point on a background thread
+        
+        Args:
+            field_data: Field information with center_lat and center_lng
+            
+        Returns:
+            Future resolving to the weather analysis dictionary
+        """
+        center_lat = field_data.get('center_lat')
+        center_lng = field_data.get('center_lng')
+        
+        if center_lat is None or center_lng is None:
+            future = Future()
+            future.set_result({
+                "current_conditions": {},
+                "forecast": [],
+                "growing_conditions": {"rating": "unknown"},
+                "irrigation_needs": {"recommendation": "unknown"},
+                "alerts": []
+            })
+            return future
+        return _weather_executor.submit(self._analyze_weather_conditions, float(center_lat), float(center_lng))
+    
     def _analyze_ndvi_data(self, image_bytes: bytes, field_data: Dict) -> Dict:
         """Analyze NDVI satellite imagery"""
         try:
@@ -182,6 +254,12 @@ class AIFieldAnalyzer:
             # Create comprehensive prompt
             prompt = self._create_analysis_prompt(data_summary)
             
+            cache_key = hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+            cached = _insights_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Reusing cached AI insights for identical field summary")
+                return dict(cached)
+            
             # Generate AI insights
             # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
             # do not change this unless explicitly requested by the user
@@ -190,7 +268,7 @@ class AIFieldAnalyzer:
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are an expert agricultural consultant with deep knowledge of precision agriculture, satellite imagery analysis, weather patterns, and crop management. Provide detailed, actionable insights based on field data."
+                        "content": ANALYSIS_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -207,7 +285,7 @@ class AIFieldAnalyzer:
             else:
                 ai_analysis = {}
             
-            return {
+            insights = {
                 'analysis_summary': ai_analysis.get('summary', ''),
                 'key_findings': ai_analysis.get('key_findings', []),
                 'recommendations': ai_analysis.get('recommendations', []),
@@ -215,6 +293,8 @@ class AIFieldAnalyzer:
                 'long_term_strategy': ai_analysis.get('long_term_strategy', ''),
                 'confidence_score': ai_analysis.get('confidence_score', 0.8)
             }
+            _insights_cache.set(cache_key, insights, AI_INSIGHTS_CACHE_TTL_SECONDS)
+            return dict(insights)
             
         except Exception as e:
             logger.error(f"Error generating AI insights: {e}")
@@ -533,34 +613,4 @@ class AIFieldAnalyzer:
     
     def _create_analysis_prompt(self, data_summary: str) -> str:
         """Create comprehensive analysis prompt for AI"""
-        return f"""
-        As an expert agricultural consultant, analyze the following field data and provide comprehensive insights:
-
-        {data_summary}
-
-        Please provide a detailed analysis in JSON format with the following structure:
-        {{
-            "summary": "Brief overview of field condition and key observations",
-            "key_findings": ["Finding 1", "Finding 2", "Finding 3"],
-            "recommendations": [
-                "Immediate action recommendation 1",
-                "Short-term recommendation 2", 
-                "Long-term strategy recommendation 3"
-            ],
-            "priority_actions": [
-                "Most urgent action needed",
-                "Second priority action"
-            ],
-            "long_term_strategy": "Strategic recommendations for field optimization",
-            "confidence_score": 0.85
-        }}
-
-        Focus on:
-        1. Crop health and vegetation vigor assessment
-        2. Weather impact on crop development
-        3. Risk identification and mitigation
-        4. Actionable management recommendations
-        5. Productivity optimization strategies
-
-        Provide specific, actionable insights that a farmer can implement.
-        """
\ No newline at end of file
+        return ANALYSIS_PROMPT_TEMPLATE.format(data_summary=data_summary)
\ No newline at end of file
@@ -8,6 +8,9 @@ import requests
 from typing import Dict, List, Tuple, Optional
 import json
 
+# Shared keep-alive connection pool for Overpass API queries
+_overpass_session = requests.Session()
+
 class GeospatialContextAnalyzer:
     """Analyzes geospatial context to identify non-crop areas like roads, buildings, water"""
     
@@ -81,7 +84,7 @@ class GeospatialContextAnalyzer:
             """
             
             overpass_url = "http://overpass-api.de/api/interpreter"
-            response = requests.post(overpass_url, data=overpass_query, timeout=15)
+            response = _overpass_session.post(overpass_url, data=overpass_query, timeout=15)
             
             if response.status_code == 200:
                 data = response.json()
@@ -118,7 +121,7 @@ class GeospatialContextAnalyzer:
             """
             
             overpass_url = "http://overpass-api.de/api/interpreter"
-            response = requests.post(overpass_url, data=overpass_query, timeout=15)
+            response = _overpass_session.post(overpass_url, data=overpass_query, timeout=15)
             
             if response.status_code == 200:
                 data = response.json()
@@ -156,7 +159,7 @@ class GeospatialContextAnalyzer:
             """
             
             overpass_url = "http://overpass-api.de/api/interpreter"
-            response = requests.post(overpass_url, data=overpass_query, timeout=15)
+            response = _overpass_session.post(overpass_url, data=overpass_query, timeout=15)
             
             if response.status_code == 200:
                 data = response.json()
@@ -4,6 +4,7 @@ import io
 import logging
 from shapely.geometry import Polygon, Point
 import math
+from functools import lru_cache
 
 def process_ndvi_data(image_data, zones):
     """
@@ -64,22 +65,34 @@ def calculate_field_zones(coordinates):
     """
     Divide a field polygon into a 3x3 grid of zones
     
+    The grid is a pure function of the polygon, so results are memoized per coordinate tuple.
+    
     Args:
         coordinates: List of [lat, lng] coordinate pairs
     
     Returns:
         Dictionary with zone IDs and their coordinate boundaries
     """
+    try:
+        key = tuple(tuple(coord) for coord in coordinates) if coordinates else ()
+    except TypeError:
+        return _calculate_field_zones(coordinates)
+    # Copy so callers can't mutate the memoized grid
+    return {zone_id: [list(point) for point in zone_coords] for zone_id, zone_coords in _cached_field_zones(key).items()}
+
+@lru_cache(maxsize=2048)
+def _cached_field_zones(coordinates):
+    return _calculate_field_zones(coordinates)
+
+def _calculate_field_zones(coordinates):
     try:
         if not coordinates or len(coordinates) < 3:
             raise ValueError("Invalid coordinates for zone calculation")
         
         # Find bounding box
-        lats = [coord[0] for coord in coordinates]
-        lngs = [coord[1] for coord in coordinates]
-        
-        min_lat, max_lat = min(lats), max(lats)
-        min_lng, max_lng = min(lngs), max(lngs)
+        coords = np.asarray(coordinates, dtype=np.float64)[:, :2]
+        min_lat, min_lng = coords.min(axis=0).tolist()
+        max_lat, max_lng = coords.max(axis=0).tolist()
         
         # Calculate grid step size
         lat_step = (max_lat - min_lat) / 3
@@ -5,6 +5,7 @@ import base64
 from PIL import Image
 import io
 import json
+import numpy as np
 
 def fetch_ndvi_image(coordinates):
     """
@@ -170,10 +171,11 @@ def calculate_bbox(coordinates):
     if not coordinates:
         return None
     
-    lats = [coord[0] for coord in coordinates]
-    lngs = [coord[1] for coord in coordinates]
+    coords = np.asarray(coordinates, dtype=np.float64)[:, :2]
+    min_lat, min_lng = coords.min(axis=0).tolist()
+    max_lat, max_lng = coords.max(axis=0).tolist()
     
-    return [min(lngs), min(lats), max(lngs), max(lats)]
+    return [min_lng, min_lat, max_lng, max_lat]
 
 def convert_coordinates_for_sentinel(coordinates):
     """
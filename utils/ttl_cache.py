@@ -0,0 +1,99 @@
+"""
+In-process TTL cache for expensive remote results
+Shared by the weather and AI services so repeat analyses of the same field reuse recent answers
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry time to live"""
+    
+    def __init__(self, maxsize: int = 256):
+        """
+        Initialize the cache
+        
+        Args:
+            maxsize: Maximum number of entries kept; least recently used entries are evicted first
+        """
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a live entry
+        
+        Args:
+            key: Cache key
+            default: Value returned on a miss or for an expired entry
+        
+        Returns:
+            Cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """
+        Store a value for ttl seconds
+        
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Time to live in seconds
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove an entry and return its value
+        
+        Args:
+            key: Cache key
+            default: Value returned when the key is absent
+        
+        Returns:
+            Removed value (even if expired) or default
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+    
+    def get_or_set(self, key: Hashable, ttl: float, compute: Callable[[], Any]) -> Optional[Any]:
+        """
+        Return the cached value for key, computing and storing it on a miss
+        
+        None results are returned but not cached, so failed lookups are retried next time.
+        
+        Args:
+            key: Cache key
+            ttl: Time to live in seconds for a newly computed value
+            compute: Zero-argument callable producing the value
+        
+        Returns:
+            Cached or freshly computed value
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
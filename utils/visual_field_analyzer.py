@@ -8,6 +8,69 @@ import json
 import logging
 from typing import Dict, Optional
 
+# Instructions shared by every visual analysis request, appended after the per-field image description
+VISUAL_ANALYSIS_INSTRUCTIONS = """
+
+VISUAL ANALYSIS INSTRUCTIONS:
+Carefully examine this satellite image and provide detailed spatial analysis. Look for:
+
+1. FIELD LAYOUT PATTERNS:
+   - Circle/pivot irrigation fields vs. rectangular fields
+   - Field boundaries and shapes
+   - Size variations between different field sections
+   - Orientation and positioning relative to each other
+
+2. INFRASTRUCTURE IDENTIFICATION:
+   - Buildings, farmhouses, barns (usually appear as small geometric shapes)
+   - Roads (linear features crossing the area)
+   - Irrigation infrastructure (center pivots, channels)
+   - Other structures or facilities
+
+3. SPATIAL RELATIONSHIPS:
+   - Describe fields by their relative positions (northernmost, southernmost, center, etc.)
+   - Use ordinal descriptions (first field from north, second largest circle, etc.)
+   - Reference infrastructure as landmarks for navigation
+
+4. VEGETATION HEALTH PATTERNS:
+   - Which specific fields/areas show healthy vegetation (dark green)
+   - Which areas show stress or problems (yellow/orange/red)
+   - Patterns within individual fields (uniform vs. patchy)
+
+5. AGRICULTURAL SETUP ANALYSIS:
+   - Type of farming operation (row crops, orchards, mixed agriculture)
+   - Irrigation method evidence (pivot circles, flood irrigation rectangles)
+   - Crop rotation or different crop types visible
+
+Provide response in JSON format:
+{
+    "field_layout": {
+        "total_field_sections": "Number of distinct field areas visible",
+        "field_types": "Description of field shapes (circular pivot fields, rectangular plots, etc.)",
+        "dominant_pattern": "Primary field layout pattern observed"
+    },
+    "infrastructure": {
+        "buildings": "Description of buildings/structures and their locations",
+        "roads": "Description of roads and their relationship to fields",
+        "irrigation": "Description of irrigation infrastructure observed"
+    },
+    "spatial_analysis": {
+        "field_positions": "Spatial description of field locations relative to each other",
+        "navigation_references": "Landmark-based descriptions for field identification"
+    },
+    "vegetation_health": {
+        "healthy_areas": "Specific description of areas with good vegetation health",
+        "stressed_areas": "Specific description of areas showing vegetation stress"
+    },
+    "agricultural_insights": {
+        "farming_type": "Type of agricultural operation observed",
+        "irrigation_method": "Irrigation methods identified from field patterns",
+        "crop_diversity": "Evidence of different crops or rotation patterns"
+    },
+    "spatial_recommendations": "Specific recommendations using spatial references from the visual analysis"
+}
+
+CRITICAL: Base your analysis ONLY on what you can actually see in the satellite image. Be specific about spatial relationships and use the vegetation index colors to assess health. Use the layout information for spatially-aware recommendations."""
+
 
 class VisualFieldAnalyzer:
     """Analyzes satellite imagery using OpenAI vision to understand field layout and characteristics"""
@@ -28,10 +91,9 @@ class VisualFieldAnalyzer:
             Dictionary containing visual analysis results
         """
         try:
-            from openai import OpenAI
-            import os
+            from .ai_field_analyzer import get_openai_client
             
-            client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+            client = get_openai_client()
             
             # Convert images to base64
             ndvi_image_b64 = base64.b64encode(ndvi_image_bytes).decode('utf-8')
@@ -111,69 +173,7 @@ Field: {field_info.get('name', 'Unknown')} ({field_info.get('area_acres', 0):.1f
 - Orange/red areas = Stressed vegetation, bare soil, or non-vegetated areas
 - The image shows field: {field_info.get('name', 'Unknown')} ({field_info.get('area_acres', 0):.1f} acres)"""
 
-        prompt += """
-
-VISUAL ANALYSIS INSTRUCTIONS:
-Carefully examine this satellite image and provide detailed spatial analysis. Look for:
-
-1. FIELD LAYOUT PATTERNS:
-   - Circle/pivot irrigation fields vs. rectangular fields
-   - Field boundaries and shapes
-   - Size variations between different field sections
-   - Orientation and positioning relative to each other
-
-2. INFRASTRUCTURE IDENTIFICATION:
-   - Buildings, farmhouses, barns (usually appear as small geometric shapes)
-   - Roads (linear features crossing the area)
-   - Irrigation infrastructure (center pivots, channels)
-   - Other structures or facilities
-
-3. SPATIAL RELATIONSHIPS:
-   - Describe fields by their relative positions (northernmost, southernmost, center, etc.)
-   - Use ordinal descriptions (first field from north, second largest circle, etc.)
-   - Reference infrastructure as landmarks for navigation
-
-4. VEGETATION HEALTH PATTERNS:
-   - Which specific fields/areas show healthy vegetation (dark green)
-   - Which areas show stress or problems (yellow/orange/red)
-   - Patterns within individual fields (uniform vs. patchy)
-
-5. AGRICULTURAL SETUP ANALYSIS:
-   - Type of farming operation (row crops, orchards, mixed agriculture)
-   - Irrigation method evidence (pivot circles, flood irrigation rectangles)
-   - Crop rotation or different crop types visible
-
-Provide response in JSON format:
-{
-    "field_layout": {
-        "total_field_sections": "Number of distinct field areas visible",
-        "field_types": "Description of field shapes (circular pivot fields, rectangular plots, etc.)",
-        "dominant_pattern": "Primary field layout pattern observed"
-    },
-    "infrastructure": {
-        "buildings": "Description of buildings/structures and their locations",
-        "roads": "Description of roads and their relationship to fields",
-        "irrigation": "Description of irrigation infrastructure observed"
-    },
-    "spatial_analysis": {
-        "field_positions": "Spatial description of field locations relative to each other",
-        "navigation_references": "Landmark-based descriptions for field identification"
-    },
-    "vegetation_health": {
-        "healthy_areas": "Specific description of areas with good vegetation health",
-        "stressed_areas": "Specific description of areas showing vegetation stress"
-    },
-    "agricultural_insights": {
-        "farming_type": "Type of agricultural operation observed",
-        "irrigation_method": "Irrigation methods identified from field patterns",
-        "crop_diversity": "Evidence of different crops or rotation patterns"
-    },
-    "spatial_recommendations": "Specific recommendations using spatial references from the visual analysis"
-}
-
-CRITICAL: Base your analysis ONLY on what you can actually see in the satellite image. Be specific about spatial relationships and use the vegetation index colors to assess health. Use the layout information for spatially-aware recommendations."""
-
-        return prompt
+        return prompt + VISUAL_ANALYSIS_INSTRUCTIONS
     
     def _get_fallback_visual_analysis(self, field_info: Dict) -> Dict:
         """Provide fallback analysis when visual analysis fails"""
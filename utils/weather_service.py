@@ -7,9 +7,18 @@ import requests
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List
 import logging
+from .ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Conditions change on an hourly scale; repeat analyses of the same field within that
+# window reuse the previous answer (coordinates rounded to ~100 m)
+WEATHER_CACHE_TTL_SECONDS = 60 * 60
+_weather_cache = TTLCache(maxsize=512)
+
+# Shared keep-alive connection pool for OpenWeatherMap calls across requests
+http_session = requests.Session()
+
 class WeatherService:
     """Service for fetching weather data using OpenWeatherMap API"""
     
@@ -31,7 +40,15 @@ class WeatherService:
         if not self.api_key:
             logger.warning("OpenWeatherMap API key not configured")
             return None
-            
+        
+        return _weather_cache.get_or_set(
+            ('current', round(lat, 3), round(lng, 3)),
+            WEATHER_CACHE_TTL_SECONDS,
+            lambda: self._fetch_current_weather(lat, lng)
+        )
+    
+    def _fetch_current_weather(self, lat: float, lng: float) -> Optional[Dict]:
+        """Request current conditions from OpenWeatherMap (uncached)"""
         try:
             url = f"{self.base_url}/weather"
             params = {
@@ -41,7 +58,7 @@ class WeatherService:
                 'units': 'metric'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = http_session.get(url, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -67,6 +84,42 @@ class WeatherService:
             logger.error(f"Failed to fetch current weather: {e}")
             return None
     
+    def get_current_weather_report(self, lat: float, lng: float) -> Optional[Dict]:
+        """
+        Fetch the raw current-conditions response in imperial units, as used in AI insight prompts
+        
+        Args:
+            lat: Latitude
+            lng: Longitude
+            
+        Returns:
+            OpenWeatherMap response dictionary or None if request fails
+        """
+        if not self.api_key:
+            return None
+        
+        return _weather_cache.get_or_set(
+            ('current_imperial', round(lat, 3), round(lng, 3)),
+            WEATHER_CACHE_TTL_SECONDS,
+            lambda: self._fetch_current_weather_report(lat, lng)
+        )
+    
+    def _fetch_current_weather_report(self, lat: float, lng: float) -> Optional[Dict]:
+        """Request raw imperial current conditions from OpenWeatherMap (uncached)"""
+        try:
+            params = {
+                'lat': lat,
+                'lon': lng,
+                'appid': self.api_key,
+                'units': 'imperial'
+            }
+            response = http_session.get(f"{self.base_url}/weather", params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.warning(f"Failed to fetch weather data: {e}")
+            return None
+    
     def get_weather_forecast(self, lat: float, lng: float, days: int = 5) -> Optional[List[Dict]]:
         """
         Fetch weather forecast for given coordinates
@@ -82,7 +135,15 @@ class WeatherService:
         if not self.api_key:
             logger.warning("OpenWeatherMap API key not configured")
             return None
-            
+        
+        return _weather_cache.get_or_set(
+            ('forecast', round(lat, 3), round(lng, 3), days),
+            WEATHER_CACHE_TTL_SECONDS,
+            lambda: self._fetch_weather_forecast(lat, lng, days)
+        )
+    
+    def _fetch_weather_forecast(self, lat: float, lng: float, days: int) -> Optional[List[Dict]]:
+        """Request the forecast from OpenWeatherMap (uncached)"""
         try:
             url = f"{self.base_url}/forecast"
             params = {
@@ -93,7 +154,7 @@ class WeatherService:
                 'cnt': days * 8  # 8 forecasts per day (every 3 hours)
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = http_session.get(url, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()